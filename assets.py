@@ -0,0 +1,138 @@
+import os
+import re
+import gzip
+import hashlib
+import logging
+import mimetypes
+
+from flask import Blueprint, Response, abort, render_template, request
+
+logger = logging.getLogger(__name__)
+
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+# Hashed asset URLs never change content, so browsers may keep them for a year
+ASSET_MAX_AGE = int(os.environ.get('ASSET_MAX_AGE', str(365 * 24 * 3600)))
+# Smaller bodies are not worth a Content-Encoding round trip
+GZIP_MIN_BYTES = 256
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+_CSS_URL = re.compile(r'''url\((['"]?)([^'")]+)\1\)''')
+
+
+class Representation:
+    """One response body kept as identity and (when it pays) gzip bytes."""
+    __slots__ = ('body', 'gzipped', 'etag', 'mimetype')
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:20]
+        self.gzipped = None
+        if mimetype.startswith(COMPRESSIBLE) and len(body) >= GZIP_MIN_BYTES:
+            # mtime=0 keeps the compressed bytes (and so the ETag) stable across restarts
+            packed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(packed) < len(body):
+                self.gzipped = packed
+
+    def respond(self, cache_control):
+        use_gzip = self.gzipped is not None and request.accept_encodings['gzip'] > 0
+        # Strong ETags must differ between encodings of the same resource
+        etag = f'{self.etag}-gz' if use_gzip else self.etag
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.gzipped if use_gzip else self.body, mimetype=self.mimetype)
+            if use_gzip:
+                response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        if self.gzipped is not None:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+class AssetManifest:
+    """Content-hashed, pre-compressed copies of every file under `root`.
+
+    `css/app.css` is served as `/assets/css/app.<hash>.css`, so a changed file
+    gets a new URL and old URLs can be cached forever. Relative url()s in
+    stylesheets are rewritten to the hashed URLs of the files they name.
+    """
+
+    def __init__(self, root=STATIC_ROOT, url_prefix='/assets'):
+        self.root = root
+        self.url_prefix = url_prefix
+        self._urls = {}  # relative path -> hashed URL
+        self._assets = {}  # hashed relative path -> Representation
+        paths = []
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                paths.append(os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, '/'))
+        # Stylesheets last, so the files they reference already have hashed URLs
+        for path in sorted(paths, key=lambda p: (p.endswith('.css'), p)):
+            self._add(path)
+
+    def _add(self, path):
+        with open(os.path.join(self.root, path), 'rb') as source:
+            body = source.read()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if path.endswith('.css'):
+            body = self._rewrite_urls(path, body.decode('utf-8')).encode('utf-8')
+        if mimetype.startswith('text/'):
+            mimetype += '; charset=utf-8'
+        asset = Representation(body, mimetype)
+        stem, ext = os.path.splitext(path)
+        hashed = f'{stem}.{asset.etag[:12]}{ext}'
+        self._assets[hashed] = asset
+        self._urls[path] = f'{self.url_prefix}/{hashed}'
+
+    def _rewrite_urls(self, path, css):
+        base = os.path.dirname(path)
+
+        def replace(match):
+            target = os.path.normpath(os.path.join(base, match.group(2))).replace(os.sep, '/')
+            url = self._urls.get(target)
+            return f'url("{url}")' if url else match.group(0)
+
+        return _CSS_URL.sub(replace, css)
+
+    def url(self, path):
+        """Hashed URL for `path` (relative to the static root); unknown paths fail loudly."""
+        return self._urls[path]
+
+    def get(self, hashed):
+        return self._assets.get(hashed)
+
+    def __len__(self):
+        return len(self._assets)
+
+
+manifest = AssetManifest()
+index_page = None
+
+assets_bp = Blueprint('assets', __name__, template_folder='templates')
+
+
+def init_app(app):
+    """Render the index page once and serve it and the hashed assets from memory."""
+    global index_page
+    app.register_blueprint(assets_bp)
+    with app.app_context():
+        html = render_template('index.html', asset=manifest.url)
+    index_page = Representation(html.encode('utf-8'), 'text/html; charset=utf-8')
+    logger.info(f"Index page rendered ({len(index_page.body)} bytes, "
+                f"{len(index_page.gzipped or index_page.body)} gzipped); {len(manifest)} static assets")
+
+
+@assets_bp.route('/', methods=['GET'])
+def index():
+    # Revalidate every time: the page names the current asset hashes
+    return index_page.respond('no-cache')
+
+
+@assets_bp.route('/assets/<path:name>', methods=['GET'])
+def asset(name):
+    found = manifest.get(name)
+    if found is None:
+        abort(404)
+    return found.respond(f'public, max-age={ASSET_MAX_AGE}, immutable')
@@ -0,0 +1,102 @@
+"""Check that /api/export memory stays flat as exported volume grows.
+
+Each scale runs in a fresh child process. The child streams the full export
+through the Flask test client from a fake paged source, then reports its
+peak RSS. The run fails when peak RSS at the largest scale exceeds the
+smallest by more than --max-growth MiB.
+
+    python benchmarks/bench_export_rss.py --scales 1 10 100
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class FakeSource:
+    """Deterministic paged inboxes/emails generated on demand, never held in memory."""
+
+    def __init__(self, inboxes, emails_per_inbox):
+        self.inboxes = inboxes
+        self.emails_per_inbox = emails_per_inbox
+        self.epoch = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def inbox_page(self, page, size):
+        start = page * size
+        stop = min(start + size, self.inboxes)
+        content = [{'id': f'inbox-{i:08d}', 'emailAddress': f'inbox-{i}@example.test',
+                    'createdAt': self.epoch + timedelta(minutes=i)} for i in range(start, stop)]
+        return content, stop >= self.inboxes
+
+    def email_page(self, inbox_id, page, size):
+        start = page * size
+        stop = min(start + size, self.emails_per_inbox)
+        n = int(inbox_id.split('-')[1])
+        content = [{'id': f'{inbox_id}-email-{j}', 'inboxId': inbox_id, 'from': 'noreply@example.test',
+                    'to': [f'inbox-{n}@example.test'], 'subject': f'Your code is {n % 1000000:06d}',
+                    'createdAt': self.epoch + timedelta(minutes=n, seconds=j)}
+                   for j in range(start, stop)]
+        return content, stop >= self.emails_per_inbox
+
+
+def child(scale, inboxes, emails, fmt, gzip):
+    from flask import Flask
+    import export
+
+    source = FakeSource(inboxes * scale, emails)
+    export.MailSlurpSource = lambda api_key: source
+    app = Flask(__name__)
+    app.register_blueprint(export.export_bp)
+    client = app.test_client()
+
+    started = time.monotonic()
+    response = client.get(f'/api/export?format={fmt}&gzip={int(gzip)}', headers={'X-API-Key': 'bench'},
+                          buffered=False)
+    total = sum(len(chunk) for chunk in response.response)
+    elapsed = time.monotonic() - started
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'scale': scale, 'records': source.inboxes * (emails + 1), 'bytes': total,
+                      'seconds': elapsed, 'peak_kib': peak_kib}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--inboxes', type=int, default=50, help='inboxes at scale 1')
+    parser.add_argument('--emails', type=int, default=20, help='emails per inbox')
+    parser.add_argument('--format', default='ndjson', choices=['ndjson', 'csv'])
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--max-growth', type=float, default=8.0, help='allowed MiB of growth')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        child(args.child, args.inboxes, args.emails, args.format, args.gzip)
+        return
+
+    results = []
+    print(f"{'scale':>6}{'records':>12}{'MiB out':>10}{'seconds':>10}{'peak RSS MiB':>14}")
+    for scale in args.scales:
+        cmd = [sys.executable, __file__, '--child', str(scale), '--inboxes', str(args.inboxes),
+               '--emails', str(args.emails), '--format', args.format]
+        if args.gzip:
+            cmd.append('--gzip')
+        result = json.loads(subprocess.check_output(cmd, cwd=ROOT).decode().strip().splitlines()[-1])
+        results.append(result)
+        print(f"{result['scale']:>6}{result['records']:>12,}{result['bytes'] / 2**20:>10.1f}"
+              f"{result['seconds']:>10.2f}{result['peak_kib'] / 1024:>14.1f}")
+
+    growth = (results[-1]['peak_kib'] - results[0]['peak_kib']) / 1024
+    print(f"peak RSS growth: {growth:.1f} MiB (limit {args.max_growth} MiB)")
+    sys.exit(0 if growth <= args.max_growth else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Drive bursty MailSlurp traffic through the upstream gateway and without it.
+
+Starts fake_mailslurp in-process with a per-key rate limit (429 +
+Retry-After) and injected failures, then runs the same mixed workload twice
+with a fresh API key each time: once on a bare ApiClient and once behind an
+UpstreamGateway. Worker threads mostly fetch a handful of hot emails (so
+identical reads overlap and can be coalesced), list inbox emails and create
+inboxes. Reports failed calls by status, latency percentiles, how many
+requests reached the upstream and what the gateway did, then checks that
+the gateway absorbed the rate limit, kept failures under
+--max-failure-rate and cut upstream traffic; exits non-zero if not.
+
+    python benchmarks/bench_gateway.py --threads 32 --requests 3000 --rate-limit 200
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_mailslurp  # noqa: E402
+from lazy_mailslurp import mailslurp_client, ApiException  # noqa: E402
+from upstream_gateway import UpstreamGateway, AdaptiveLimit  # noqa: E402
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def build_client(base_url, api_key, pool_maxsize):
+    configuration = mailslurp_client.Configuration()
+    configuration.api_key['x-api-key'] = api_key
+    configuration.connection_pool_maxsize = pool_maxsize
+    configuration.host = base_url
+    return mailslurp_client.ApiClient(configuration)
+
+
+def run(mode, base_url, state, args):
+    api_key = f'bench-{mode}'
+    client = build_client(base_url, api_key, args.threads)
+    gateway = None
+    if mode == 'gateway':
+        gateway = UpstreamGateway(rate=args.gateway_rate,
+                                  concurrency=AdaptiveLimit(initial=args.concurrency, maximum=args.threads))
+        gateway.install(client)
+    inbox_api = mailslurp_client.InboxControllerApi(client)
+    email_api = mailslurp_client.EmailControllerApi(client)
+
+    # Seed data straight into the fake so setup is not rate limited
+    seeded = [state.create_inbox(api_key)['id'] for _ in range(args.hot)]
+    hot = [state.deliver(inbox_id)['id'] for inbox_id in seeded]
+
+    operations = (['read'] * 6) + (['list'] * 3) + ['create']
+    remaining = [args.requests]
+    lock = threading.Lock()
+    latencies = []
+    failures = Counter()
+    upstream_before = state.requests
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            operation = random.choice(operations)
+            started = time.perf_counter()
+            try:
+                if operation == 'read':
+                    email_api.get_email(random.choice(hot))
+                elif operation == 'list':
+                    inbox_api.get_inbox_emails_paginated(random.choice(seeded), page=0, size=20)
+                else:
+                    inbox_api.create_inbox()
+            except ApiException as e:
+                with lock:
+                    failures[e.status] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - started
+    latencies.sort()
+    return {
+        'mode': mode,
+        'wall': wall,
+        'ok': len(latencies),
+        'failures': failures,
+        'upstream': state.requests - upstream_before,
+        'p50': percentile(latencies, 0.50),
+        'p99': percentile(latencies, 0.99),
+        'gateway': gateway.stats() if gateway else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--hot', type=int, default=5, help='distinct emails the reads pick from')
+    parser.add_argument('--latency', type=float, default=0.02, help='fake upstream latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--rate-limit', type=float, default=200.0, help='fake per-key requests/s')
+    parser.add_argument('--error-rate', type=float, default=0.03)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--gateway-rate', type=float, default=0.0, help='gateway token bucket (0 = off)')
+    parser.add_argument('--concurrency', type=int, default=8, help='initial gateway concurrency limit')
+    parser.add_argument('--max-failure-rate', type=float, default=0.01,
+                        help='share of gateway calls allowed to fail')
+    args = parser.parse_args()
+
+    config = fake_mailslurp.FakeConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                       error_status=args.error_status, rate_limit=args.rate_limit)
+    fake, base_url = fake_mailslurp.start_in_thread(config)
+    mailslurp_client.load()
+
+    print(f"{'mode':<9}{'ok':>7}{'failed':>8}{'wall s':>8}{'ok/s':>8}{'p50 ms':>8}{'p99 ms':>9}{'upstream':>10}")
+    results = [run(mode, base_url, fake.state, args) for mode in ('direct', 'gateway')]
+    for result in results:
+        failed = sum(result['failures'].values())
+        print(f"{result['mode']:<9}{result['ok']:>7}{failed:>8}{result['wall']:>8.2f}"
+              f"{result['ok'] / result['wall']:>8.0f}{result['p50'] * 1000:>8.1f}"
+              f"{result['p99'] * 1000:>9.1f}{result['upstream']:>10}")
+    for result in results:
+        if result['failures']:
+            print(f"{result['mode']} failures by status: {dict(result['failures'])}")
+    stats = results[-1]['gateway']
+    print(f"gateway: {stats['retries']} retries, {stats['coalesced']} coalesced, {stats['throttled']} throttled, "
+          f"concurrency limit {stats['concurrencyLimit']} ({stats['limitDecreases']} decreases)")
+    fake.shutdown()
+
+    problems = check(*results, args)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if problems:
+        sys.exit(1)
+    print("PASS")
+
+
+def check(direct, gateway, args):
+    """What the gateway failed to do better than the bare client, if anything."""
+    problems = []
+    for result in (direct, gateway):
+        total = result['ok'] + sum(result['failures'].values())
+        if total != args.requests:
+            problems.append(f"{result['mode']} accounted for {total} of {args.requests} requests")
+    if gateway['failures'][429]:
+        problems.append(f"{gateway['failures'][429]} rate-limited calls reached the caller through the gateway")
+    failed = sum(gateway['failures'].values())
+    if failed > args.max_failure_rate * args.requests:
+        problems.append(f"gateway failed {failed} of {args.requests} calls "
+                        f"(allowed {args.max_failure_rate:.1%})")
+    if failed > sum(direct['failures'].values()):
+        problems.append("gateway failed more calls than the bare client")
+    if gateway['upstream'] >= direct['upstream']:
+        problems.append(f"gateway sent {gateway['upstream']} upstream requests, "
+                        f"bare client {direct['upstream']}")
+    return problems
+
+
+if __name__ == '__main__':
+    main()
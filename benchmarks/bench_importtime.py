@@ -0,0 +1,141 @@
+"""Track cold-start time and per-worker memory of the app.
+
+Each mode runs in fresh interpreters so nothing is cached in-process:
+
+  lazy     import the app, serve the first request, then the first call that
+           needs the MailSlurp client (what a scale-out container pays)
+  prewarm  the same with MAILSLURP_PREWARM=true
+
+Then it mimics a pre-fork server. A master imports the app (with or without
+prewarm) and forks --workers children. Each child loads the MailSlurp client
+and reports RSS plus the memory private to it (USS, from smaps_rollup), which
+is what every extra worker really costs.
+
+    python benchmarks/bench_importtime.py --runs 5 --workers 4
+    python benchmarks/bench_importtime.py --importtime   # slowest imports
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START = r'''
+import json, sys, time
+started = time.perf_counter()
+import importlib
+module_name, attr = sys.argv[1].split(':')
+app = getattr(importlib.import_module(module_name), attr)
+imported = time.perf_counter()
+app.test_client().get(sys.argv[2])
+first_request = time.perf_counter()
+import lazy_mailslurp
+loaded_before = lazy_mailslurp.mailslurp_client.loaded
+lazy_mailslurp.prewarm()
+client_ready = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (first_request - started) * 1000,
+    'client_ready_ms': (client_ready - started) * 1000,
+    'client_loaded_at_start': loaded_before,
+}))
+'''
+
+PRE_FORK = r'''
+import os, sys, json, importlib
+module_name, attr = sys.argv[1].split(':')
+getattr(importlib.import_module(module_name), attr)
+import lazy_mailslurp
+
+def memory_kib():
+    values = {}
+    with open('/proc/self/smaps_rollup') as rollup:
+        for line in rollup:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Private_Clean:', 'Private_Dirty:'):
+                values[parts[0]] = int(parts[1])
+    return values['Rss:'], values['Private_Clean:'] + values['Private_Dirty:']
+
+read_end, write_end = os.pipe()
+children = []
+for _ in range(int(sys.argv[2])):
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        lazy_mailslurp.prewarm()
+        rss, uss = memory_kib()
+        os.write(write_end, (json.dumps({'rss_kib': rss, 'uss_kib': uss}) + '\n').encode())
+        os._exit(0)
+    children.append(pid)
+os.close(write_end)
+for pid in children:
+    os.waitpid(pid, 0)
+with os.fdopen(read_end) as results:
+    workers = [json.loads(line) for line in results]
+print(json.dumps({'master_rss_kib': memory_kib()[0], 'workers': workers}))
+'''
+
+
+def run_python(code, args, prewarm, extra=()):
+    env = dict(os.environ, MAILSLURP_PREWARM='true' if prewarm else 'false',
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, *extra, '-c', code, *args], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    return result
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', default='EmailGen:app', help='module:attribute of the Flask app')
+    parser.add_argument('--path', default='/', help='first request to serve')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--importtime', action='store_true', help='list the slowest imports of a cold start')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    args = parser.parse_args()
+
+    if args.importtime:
+        stderr = run_python(COLD_START, [args.app, args.path], False, ['-X', 'importtime']).stderr
+        rows = []
+        for line in stderr.splitlines():
+            parts = line.split('|')
+            if len(parts) == 3 and parts[1].strip().isdigit():
+                rows.append((int(parts[1]), parts[2].rstrip()))
+        for cumulative, name in sorted(rows, reverse=True)[:25]:
+            print(f'{cumulative / 1000:9.1f} ms {name}')
+        return
+
+    for prewarm in (False, True):
+        mode = 'prewarm' if prewarm else 'lazy'
+        runs = [json.loads(run_python(COLD_START, [args.app, args.path], prewarm).stdout)
+                for _ in range(args.runs)]
+        fork = json.loads(run_python(PRE_FORK, [args.app, str(args.workers)], prewarm).stdout)
+        result = {
+            'mode': mode,
+            'import_ms': median(r['import_ms'] for r in runs),
+            'first_request_ms': median(r['first_request_ms'] for r in runs),
+            'client_ready_ms': median(r['client_ready_ms'] for r in runs),
+            'master_rss_kib': fork['master_rss_kib'],
+            'worker_rss_kib': median(w['rss_kib'] for w in fork['workers']),
+            'worker_uss_kib': median(w['uss_kib'] for w in fork['workers']),
+        }
+        if args.json:
+            print(json.dumps(result))
+            continue
+        if not prewarm:
+            print(f"{'mode':<9}{'import ms':>11}{'1st req ms':>12}{'client ms':>11}"
+                  f"{'master RSS':>12}{'worker RSS':>12}{'worker USS':>12}")
+        print(f"{mode:<9}{result['import_ms']:>11.0f}{result['first_request_ms']:>12.0f}"
+              f"{result['client_ready_ms']:>11.0f}{result['master_rss_kib'] / 1024:>10.1f}MB"
+              f"{result['worker_rss_kib'] / 1024:>10.1f}MB{result['worker_uss_kib'] / 1024:>10.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Micro-benchmark for the OTP extraction engine.
+
+Builds a synthetic corpus of realistic OTP emails (plain text, HTML,
+multipart MIME, ~1 MB newsletters and emails with decoy numbers before the
+code) and reports ns/email and wrong codes per kind. With --gate, exits
+non-zero when any kind is slower than its budget or misses a code, so it can
+guard against regressions in CI.
+
+    python benchmarks/bench_otp.py --gate
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from otp_extractor import OtpExtractor  # noqa: E402
+
+# Budgets in ns/email, generous enough for a shared CI runner
+BUDGETS = {
+    'plain': 20_000,
+    'html': 60_000,
+    'multipart': 80_000,
+    'newsletter': 60_000_000,
+    'decoys': 20_000,
+}
+
+# Numbers next to OTP keywords that are not the OTP; each once returned the
+# decoy at HIGH confidence, hiding the real code that follows
+DECOYS = [
+    'Ship to zip code 90210. Your code is {code}',
+    'Barcode 12345678 then your OTP is {code}',
+    'Code expires 2025-01-01. Your verification code is {code}',
+]
+
+
+def plain_email(code):
+    return (f"Hi there,\n\nYour verification code is {code}. It expires in 10 minutes.\n\n"
+            "If you did not request this, ignore this email.\n\nThanks,\nThe Acme Team\n")
+
+
+def html_email(code):
+    return ("<!DOCTYPE html><html><head><style>body{font-family:Arial}.c{font-size:24px}</style>"
+            "</head><body><table width=\"100%\"><tr><td><h1>Sign in to Acme</h1>"
+            "<p>Use the following one-time password to finish signing in:</p>"
+            f"<p class=\"c\"><strong>{code}</strong></p>"
+            "<p>This code expires in 10 minutes. Order #2024-11 &amp; invoice 77.</p>"
+            "</td></tr></table><script>var t = 123456789;</script></body></html>")
+
+
+def multipart_email(code):
+    boundary = '----=_Part_12345_67890.1700000000000'
+    return (f"Content-Type: multipart/alternative; boundary=\"{boundary}\"\r\n\r\n"
+            f"--{boundary}\r\nContent-Type: text/plain; charset=UTF-8\r\n\r\n"
+            f"{plain_email(code)}\r\n"
+            f"--{boundary}\r\nContent-Type: text/html; charset=UTF-8\r\n\r\n"
+            f"{html_email(code)}\r\n--{boundary}--\r\n")
+
+
+def newsletter_email(code, size=1_000_000):
+    rng = random.Random(code)
+    words = ['update', 'product', 'launch', 'team', 'news', 'week', 'customers', 'offer',
+             'release', 'feature', 'pricing', 'event', 'community', 'story']
+    blocks = []
+    total = 0
+    while total < size:
+        text = ' '.join(rng.choice(words) for _ in range(60))
+        block = (f"<tr><td class=\"article\"><h2>{text[:40]}</h2><p>{text}</p>"
+                 f"<a href=\"https://example.com/a/{rng.randint(1, 10**6)}\">Read more</a></td></tr>")
+        blocks.append(block)
+        total += len(block)
+    middle = len(blocks) // 2
+    blocks.insert(middle, f"<tr><td><p>Your security code is <b>{code}</b></p></td></tr>")
+    return "<html><body><table>" + ''.join(blocks) + "</table></body></html>"
+
+
+def decoy_email(code, template):
+    return template.format(code=code)
+
+
+def build_corpus(count):
+    rng = random.Random(42)
+    codes = [f'{rng.randint(0, 999999):06d}' for _ in range(count)]
+    return {
+        'plain': [(plain_email(c), c) for c in codes],
+        'html': [(html_email(c), c) for c in codes],
+        'multipart': [(multipart_email(c), c) for c in codes],
+        'newsletter': [(newsletter_email(c), c) for c in codes[:max(1, count // 50)]],
+        'decoys': [(decoy_email(c, DECOYS[i % len(DECOYS)]), c) for i, c in enumerate(codes)],
+    }
+
+
+def run(extractor, emails, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for body, _ in emails:
+            extractor.extract(body)
+        elapsed = (time.perf_counter_ns() - start) / len(emails)
+        best = elapsed if best is None else min(best, elapsed)
+    misses = sum(1 for body, code in emails if extractor.extract(body)['otp'] != code)
+    return best, misses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=200, help='emails per kind')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--gate', action='store_true', help='fail when a budget is exceeded')
+    args = parser.parse_args()
+
+    extractor = OtpExtractor()
+    corpus = build_corpus(args.count)
+    failed = False
+    print(f"{'kind':<12}{'emails':>8}{'ns/email':>14}{'budget':>14}{'misses':>8}")
+    for kind, emails in corpus.items():
+        ns, misses = run(extractor, emails, args.repeat)
+        over = ns > BUDGETS[kind]
+        failed |= (over or misses > 0) and args.gate
+        flag = '  OVER BUDGET' if over else ''
+        print(f"{kind:<12}{len(emails):>8}{ns:>14,.0f}{BUDGETS[kind]:>14,}{misses:>8}{flag}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
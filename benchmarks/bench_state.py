@@ -0,0 +1,243 @@
+"""Scale the wait flow across 1-16 worker processes and compare state backends.
+
+Starts fake_mailslurp and N app workers, each its own process on its own port
+(how gunicorn workers or nodes behind a load balancer look to a client). For
+every inbox the driver submits a wait and polls its ticket until the email
+arrives. Requests go to a random worker ('random', like a round-robin
+balancer) or to the worker a consistent hash of the inbox ID picks ('hash',
+an inbox-affine balancer using routing.HashRing, which the workers also get
+as CLUSTER_NODES). With the memory backend, random routing loses waits whose
+polls land on a worker that never saw them; the sqlite backend answers them
+from any worker.
+
+Reports completed and lost waits, throughput, submit-to-result latency,
+upstream requests per wait and the emailCount one worker reports from
+/api/stats (a per-process figure with the memory backend).
+
+    python benchmarks/bench_state.py --workers 1 2 4 8 16 --inboxes 400
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from routing import HashRing  # noqa: E402
+
+WORKER = r'''
+import sys, logging, importlib
+module_name, attr = sys.argv[1].split(':')
+app = getattr(importlib.import_module(module_name), attr)
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
+from werkzeug.serving import make_server
+make_server('127.0.0.1', int(sys.argv[2]), app, threaded=True).serve_forever()
+'''
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Connections:
+    """One keep-alive connection per worker for the calling thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def request(self, base_url, method, path, payload=None):
+        conns = self._local.__dict__.setdefault('conns', {})
+        conn = conns.get(base_url)
+        if conn is None:
+            url = urlsplit(base_url)
+            conn = conns[base_url] = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+        body = json.dumps(payload) if payload is not None else None
+        conn.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b'null')
+
+
+def wait_ready(url, deadline):
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(urlsplit(url).hostname, urlsplit(url).port, timeout=1)
+            conn.request('GET', '/api/stats')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    sys.exit(f'Worker {url} did not start')
+
+
+def start_workers(count, backend, db_path, fake_url, args):
+    ports = [free_port() for _ in range(count)]
+    nodes = [f'http://127.0.0.1:{port}' for port in ports]
+    processes = []
+    for port, node in zip(ports, nodes):
+        env = dict(os.environ, MAILSLURP_HOST=fake_url, STATE_BACKEND=backend, STATE_DB_PATH=db_path,
+                   CLUSTER_NODES=','.join(nodes), NODE_URL=node, MAILSLURP_PREWARM='true',
+                   WAIT_EMAIL_POLL_INTERVAL=str(args.poll_interval), INBOX_CREATE_RATE='0',
+                   PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+        processes.append(subprocess.Popen([sys.executable, '-c', WORKER, args.app, str(port)], cwd=ROOT, env=env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    deadline = time.monotonic() + 60
+    for node in nodes:
+        wait_ready(node, deadline)
+    return nodes, processes
+
+
+def fake_requests(connections, fake_url):
+    return connections.request(fake_url, 'GET', '/_fake/stats')[1]['requests']
+
+
+def run(backend, routing_mode, workers, fake_url, args):
+    db_path = os.path.join(tempfile.mkdtemp(prefix='emailgen-state-'), 'state.db')
+    nodes, processes = start_workers(workers, backend, db_path, fake_url, args)
+    ring = HashRing(nodes)
+    connections = Connections()
+    api_key = f'bench-{backend}-{routing_mode}-{workers}'
+    try:
+        inboxes = []
+        while len(inboxes) < args.inboxes:
+            count = min(500, args.inboxes - len(inboxes))
+            _, body = connections.request(nodes[0], 'POST', '/api/inboxes/batch',
+                                          {'apiKey': api_key, 'count': count, 'concurrency': 16})
+            inboxes.extend(inbox['id'] for inbox in body['inboxes'])
+
+        def pick(inbox_id):
+            return ring.node_for(inbox_id) if routing_mode == 'hash' else random.choice(nodes)
+
+        outcomes = {'ok': 0, 'lost': 0, 'timeout': 0, 'error': 0}
+        latencies = []
+        lock = threading.Lock()
+        queue = list(inboxes)
+        upstream_before = fake_requests(connections, fake_url)
+        started = time.monotonic()
+
+        def driver():
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    inbox_id = queue.pop()
+                submitted = time.monotonic()
+                status, body = connections.request(pick(inbox_id), 'POST', '/api/wait_email/submit',
+                                                   {'apiKey': api_key, 'inboxId': inbox_id, 'timeout': args.timeout})
+                ticket = body.get('ticket') if status == 202 else None
+                outcome = 'error' if ticket is None else None
+                while outcome is None:
+                    time.sleep(args.poll)
+                    status, body = connections.request(pick(inbox_id), 'GET', f'/api/wait_email/{ticket}')
+                    if status == 404:
+                        outcome = 'lost'
+                    elif body.get('pending'):
+                        continue
+                    elif body.get('success'):
+                        outcome = 'ok'
+                    else:
+                        outcome = 'timeout' if body.get('timeout') else 'error'
+                with lock:
+                    outcomes[outcome] += 1
+                    if outcome == 'ok':
+                        latencies.append(time.monotonic() - submitted)
+
+        threads = [threading.Thread(target=driver) for _ in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.monotonic() - started
+        upstream = fake_requests(connections, fake_url) - upstream_before
+        _, stats = connections.request(nodes[0], 'GET', '/api/stats')
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+    latencies.sort()
+    return {
+        'backend': backend,
+        'routing': routing_mode,
+        'workers': workers,
+        **outcomes,
+        'waits_per_s': outcomes['ok'] / wall,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'upstream_per_wait': upstream / len(inboxes),
+        'email_count': stats.get('emailCount'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', default='EmailGen:app', help='module:attribute of the Flask app')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--modes', nargs='+', default=['memory:hash', 'memory:random', 'sqlite:random', 'sqlite:hash'],
+                        help='backend:routing pairs to run')
+    parser.add_argument('--inboxes', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=64, help='driver threads')
+    parser.add_argument('--timeout', type=int, default=30, help='wait timeout (s)')
+    parser.add_argument('--poll', type=float, default=0.1, help='ticket poll interval (s)')
+    parser.add_argument('--poll-interval', type=float, default=0.5, help='workers\' upstream poll interval (s)')
+    parser.add_argument('--latency', type=float, default=0.01, help='fake upstream latency (s)')
+    parser.add_argument('--arrival-delay', type=float, default=1.0, help='seconds until each email arrives')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    args = parser.parse_args()
+
+    fake_port = free_port()
+    fake_url = f'http://127.0.0.1:{fake_port}'
+    fake = subprocess.Popen([sys.executable, os.path.join(ROOT, 'fake_mailslurp.py'), '--port', str(fake_port),
+                             '--latency', str(args.latency), '--arrival-delay', str(args.arrival_delay),
+                             '--arrival-jitter', str(args.arrival_delay)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', fake_port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    sys.exit('fake_mailslurp did not start')
+                time.sleep(0.05)
+
+        if not args.json:
+            print(f"{'backend':<8}{'routing':<8}{'workers':>8}{'ok':>6}{'lost':>6}{'t/o':>5}{'waits/s':>9}"
+                  f"{'p50 ms':>8}{'p99 ms':>8}{'up/wait':>9}{'emails':>8}")
+        for mode in args.modes:
+            backend, routing_mode = mode.split(':')
+            for workers in args.workers:
+                result = run(backend, routing_mode, workers, fake_url, args)
+                if args.json:
+                    print(json.dumps(result), flush=True)
+                    continue
+                print(f"{backend:<8}{routing_mode:<8}{workers:>8}{result['ok']:>6}{result['lost']:>6}"
+                      f"{result['timeout']:>5}{result['waits_per_s']:>9.1f}{result['p50_ms']:>8.0f}"
+                      f"{result['p99_ms']:>8.0f}{result['upstream_per_wait']:>9.2f}{result['email_count']:>8}",
+                      flush=True)
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Measure how WaitEngine scales with concurrent waiters.
+
+Uses a fake fetch that "delivers" an email after a random delay, so no
+MailSlurp account is needed. Point MAILSLURP_HOST at a local stand-in and
+pass --upstream to exercise the real client path instead.
+
+    python benchmarks/bench_wait_engine.py --waiters 500
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inbox_watcher import InboxWatcher, fetch_unread_emails  # noqa: E402
+from wait_engine import WaitEngine  # noqa: E402
+
+
+def fake_fetch_factory(min_delay, max_delay):
+    arrivals = {}
+    lock = threading.Lock()
+
+    def fetch(api_key, inbox_ids):
+        now = time.monotonic()
+        results = []
+        with lock:
+            for inbox_id in inbox_ids:
+                due = arrivals.setdefault(inbox_id, now + random.uniform(min_delay, max_delay))
+                if now >= due:
+                    results.append((inbox_id, {'success': True, 'id': f'email-{inbox_id}', 'inboxId': inbox_id}))
+        return results
+
+    return fetch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--waiters', type=int, default=200)
+    parser.add_argument('--timeout', type=int, default=30)
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--min-delay', type=float, default=0.5)
+    parser.add_argument('--max-delay', type=float, default=5.0)
+    parser.add_argument('--api-key', default='bench-key')
+    parser.add_argument('--upstream', action='store_true',
+                        help='use the real MailSlurp client (honours MAILSLURP_HOST)')
+    args = parser.parse_args()
+
+    fetch = fetch_unread_emails if args.upstream else fake_fetch_factory(args.min_delay, args.max_delay)
+    watcher = InboxWatcher(fetch_batch=fetch, poll_interval=args.poll_interval)
+    engine = WaitEngine(watcher=watcher)
+
+    threads_before = threading.active_count()
+    start = time.monotonic()
+    latencies = []
+    tickets = []
+    for i in range(args.waiters):
+        submitted = time.monotonic()
+        ticket = engine.submit(args.api_key, f'inbox-{i}', args.timeout)
+        engine.future(ticket).add_done_callback(
+            lambda _, submitted=submitted: latencies.append(time.monotonic() - submitted))
+        tickets.append(ticket)
+    peak_threads = threading.active_count()
+
+    outcomes = {'success': 0, 'timeout': 0, 'error': 0}
+    for ticket in tickets:
+        result = engine.future(ticket).result()
+        peak_threads = max(peak_threads, threading.active_count())
+        if result.get('success'):
+            outcomes['success'] += 1
+        elif result.get('timeout'):
+            outcomes['timeout'] += 1
+        else:
+            outcomes['error'] += 1
+
+    latencies.sort()
+    elapsed = time.monotonic() - start
+    print(f"waiters:        {args.waiters}")
+    print(f"outcomes:       {outcomes}")
+    print(f"elapsed:        {elapsed:.2f}s")
+    print(f"p50 / p99:      {latencies[len(latencies) // 2]:.2f}s / {latencies[int(len(latencies) * 0.99) - 1]:.2f}s")
+    print(f"threads:        {threads_before} before, {peak_threads} peak")
+    print(f"upstream calls: {watcher.stats()['upstreamCalls']} in {watcher.stats()['sweeps']} sweeps")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""Replay MailSlurp new-email webhooks into the app and time waiter wake-ups.
+
+Starts fake_mailslurp in-process and serves the app locally with
+WEBHOOK_BASE_URL pointing at it, so every inbox created through the app
+registers a webhook with the stand-in. Each inbox gets a pending wait and an
+email upstream, then its webhook payload is POSTed back at a fixed rate.
+Reports webhook throughput, webhook-to-waiter latency and upstream calls per
+email, and exits non-zero unless every webhook was accepted, every waiter
+woke with its own email and no email was ingested twice however often its
+webhook was replayed (--repeat). Polling is pushed out of the way (WAIT_EMAIL_POLL_INTERVAL) so only
+the push path is measured.
+
+Payloads are synthesised in MailSlurp's EMAIL_RECEIVED shape unless
+--payloads names an NDJSON file of recorded ones; their IDs are rewritten to
+the inboxes and emails created for the run.
+
+    python benchmarks/bench_webhooks.py --inboxes 500 --rate 2000 --repeat 2
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import logging
+import argparse
+import importlib
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_mailslurp  # noqa: E402
+
+API_KEY = 'bench-key'
+
+
+def synthetic_payload():
+    return {
+        'eventName': 'EMAIL_RECEIVED',
+        'webhookName': 'emailgen',
+        'to': [],
+        'from': 'noreply@example.test',
+        'cc': [],
+        'bcc': [],
+        'subject': 'Your verification code',
+        'attachmentMetaDatas': [],
+    }
+
+
+def load_payloads(path):
+    with open(path) as records:
+        return [json.loads(line) for line in records if line.strip()]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', default='EmailGen:app', help='module:attribute of the Flask app')
+    parser.add_argument('--inboxes', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=1000.0, help='webhooks per second; 0 = unthrottled')
+    parser.add_argument('--concurrency', type=int, default=8, help='sender connections')
+    parser.add_argument('--repeat', type=int, default=1, help='send each webhook this many times')
+    parser.add_argument('--payloads', help='NDJSON file of recorded webhook payloads')
+    parser.add_argument('--latency', type=float, default=0.02, help='fake upstream latency (s)')
+    args = parser.parse_args()
+
+    config = fake_mailslurp.FakeConfig(latency=args.latency)
+    fake, fake_url = fake_mailslurp.start_in_thread(config)
+    port = free_port()
+    os.environ['MAILSLURP_HOST'] = fake_url
+    os.environ['WEBHOOK_BASE_URL'] = f'http://127.0.0.1:{port}'
+    os.environ.setdefault('WAIT_EMAIL_POLL_INTERVAL', '3600')
+    os.environ.setdefault('INBOX_CREATE_RATE', '0')
+
+    module_name, attr = args.app.split(':')
+    app = getattr(importlib.import_module(module_name), attr)
+    from werkzeug.serving import make_server
+    from inbox_pool import provision_inboxes
+    from inbox_watcher import inbox_watcher
+    from webhooks import inbox_index
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    inboxes, errors = provision_inboxes(API_KEY, args.inboxes, 16)
+    if errors:
+        sys.exit(f"Inbox creation failed: {errors[0]}")
+    state = fake.state
+    deadline = time.monotonic() + 30
+    while inbox_index.stats()['registered'] < len(inboxes):
+        if time.monotonic() > deadline:
+            sys.exit('Webhook registration did not finish')
+        time.sleep(0.05)
+
+    templates = load_payloads(args.payloads) if args.payloads else [synthetic_payload()]
+    woken = {}
+    received = {}  # inbox_id -> email ID its waiter woke with
+    expected = {}
+    lock = threading.Lock()
+    jobs = []
+    for i, inbox in enumerate(inboxes):
+        inbox_id = inbox['id']
+        future = inbox_watcher.watch(API_KEY, inbox_id, 120)
+        future.add_done_callback(lambda f, inbox_id=inbox_id: (
+            woken.setdefault(inbox_id, time.monotonic()), received.setdefault(inbox_id, f.result().get('id'))))
+        email = state.deliver(inbox_id)
+        expected[inbox_id] = email['id']
+        webhook = state.webhooks[inbox_id][0]
+        url = urlsplit(webhook['url'])
+        payload = dict(templates[i % len(templates)], inboxId=inbox_id, emailId=email['id'],
+                       webhookId=webhook['id'], messageId=str(uuid.uuid4()), createdAt=email['createdAt'])
+        body = json.dumps(payload)
+        jobs.extend((inbox_id, f'{url.path}?{url.query}', body) for _ in range(args.repeat))
+
+    sent = {}
+    rejected = [0]
+    upstream_before = state.requests
+    started = time.monotonic()
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+
+    def sender(offset):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        for index in range(offset, len(jobs), args.concurrency):
+            inbox_id, path, body = jobs[index]
+            delay = started + index * interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with lock:
+                sent.setdefault(inbox_id, time.monotonic())
+            conn.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                with lock:
+                    rejected[0] += 1
+
+    threads = [threading.Thread(target=sender, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    send_wall = time.monotonic() - started
+    deadline = time.monotonic() + 30
+    while len(woken) < len(inboxes) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    upstream_calls = state.requests - upstream_before
+
+    latencies = sorted(woken[i] - sent[i] for i in woken if i in sent)
+    stats = inbox_index.stats()
+    print(f"{len(jobs)} webhooks for {len(inboxes)} inboxes in {send_wall:.2f}s "
+          f"({len(jobs) / send_wall:.0f}/s), {rejected[0]} rejected")
+    print(f"waiters woken {len(woken)}/{len(inboxes)}; webhook->waiter p50 "
+          f"{percentile(latencies, 0.50) * 1000:.1f} ms, p95 {percentile(latencies, 0.95) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"upstream calls per email {upstream_calls / len(inboxes):.2f}; "
+          f"delivered {stats['delivered']}, unclaimed {stats['unclaimed']}, duplicates {stats['duplicates']}")
+    server.shutdown()
+
+    problems = []
+    if rejected[0]:
+        problems.append(f"{rejected[0]} webhooks were rejected")
+    if len(woken) < len(inboxes):
+        problems.append(f"only {len(woken)} of {len(inboxes)} waiters were woken")
+    wrong = sum(1 for inbox_id, email_id in received.items() if email_id != expected[inbox_id])
+    if wrong:
+        problems.append(f"{wrong} waiters woke without their inbox's email")
+    # Each email may be ingested once: replays must count as duplicates
+    ingested = stats['delivered'] + stats['unclaimed']
+    if ingested > len(inboxes):
+        problems.append(f"{ingested} ingestions for {len(inboxes)} emails; replays were delivered again")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if problems:
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""End-to-end benchmark of the Flask app against the local MailSlurp stand-in.
+
+Starts fake_mailslurp in-process, points the app at it via MAILSLURP_HOST,
+serves the app on a local threaded WSGI server and drives each endpoint at a
+fixed concurrency. Reports p50/p95/p99 latency, throughput and worker
+utilisation (mean busy request slots / concurrency) per endpoint.
+
+    python benchmarks/run_bench.py --concurrency 32 --duration 10 \\
+        --endpoints create_inbox wait_submit extract_otp --latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import importlib
+import threading
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_mailslurp  # noqa: E402
+
+API_KEY = 'bench-key'
+OTP_BODY = ('<html><body><p>Hello,</p><p>Your verification code is <b>482913</b>.</p>'
+            '<p>It expires in 10 minutes.</p></body></html>')
+
+
+class UtilisationMiddleware:
+    """Integrates in-flight requests over time to measure how busy workers are."""
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+        self.last = time.monotonic()
+
+    def _tick(self, delta):
+        now = time.monotonic()
+        self.busy_seconds += self.in_flight * (now - self.last)
+        self.last = now
+        self.in_flight += delta
+
+    def reset(self):
+        with self.lock:
+            self._tick(0)
+            self.busy_seconds = 0.0
+
+    def __call__(self, environ, start_response):
+        with self.lock:
+            self._tick(1)
+        try:
+            return list(self.app(environ, start_response))
+        finally:
+            with self.lock:
+                self._tick(-1)
+
+
+class Client:
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body else {}
+        self.conn.request(method, path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        data = response.read()
+        return response.status, json.loads(data) if data else None
+
+
+# Scenarios: setup(client, fake_state) -> context; run(client, fake_state, context) -> ok
+
+def _fake_inbox(state):
+    return state.create_inbox(API_KEY)['id']
+
+
+SCENARIOS = {
+    'create_inbox': (
+        lambda client, state: None,
+        lambda client, state, ctx: client.request('POST', '/api/create_inbox', {'apiKey': API_KEY})[0] == 200,
+    ),
+    'inboxes_batch': (
+        lambda client, state: None,
+        lambda client, state, ctx: client.request(
+            'POST', '/api/inboxes/batch', {'apiKey': API_KEY, 'count': 10, 'concurrency': 4})[0] == 200,
+    ),
+    'wait_submit': (
+        lambda client, state: _fake_inbox(state),
+        lambda client, state, inbox_id: _submit_and_poll(client, state, inbox_id),
+    ),
+    'extract_otp': (
+        lambda client, state: None,
+        lambda client, state, ctx: client.request('POST', '/api/extract_otp', {'content': OTP_BODY})[0] == 200,
+    ),
+    'extract_otp_batch': (
+        lambda client, state: None,
+        lambda client, state, ctx: client.request(
+            'POST', '/api/extract_otp/batch', {'contents': [OTP_BODY] * 50})[0] == 200,
+    ),
+}
+
+
+def _submit_and_poll(client, state, inbox_id, interval=0.05):
+    state.deliver(inbox_id)
+    status, body = client.request('POST', '/api/wait_email/submit', {'apiKey': API_KEY, 'inboxId': inbox_id})
+    if status != 202:
+        return False
+    while True:
+        status, result = client.request('GET', f"/api/wait_email/{body['ticket']}")
+        if status != 200 or not result.get('pending'):
+            return status == 200 and bool(result.get('success'))
+        time.sleep(interval)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def drive(name, port, state, middleware, concurrency, duration):
+    setup, run = SCENARIOS[name]
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = [None]
+    ready = threading.Barrier(concurrency + 1)
+
+    def worker():
+        client = Client(port)
+        ctx = setup(client, state)
+        ready.wait()
+        local, failed = [], 0
+        while time.monotonic() < stop_at[0]:
+            started = time.monotonic()
+            try:
+                ok = run(client, state, ctx)
+            except Exception:
+                ok = False
+                client = Client(port)
+            local.append(time.monotonic() - started)
+            failed += not ok
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    stop_at[0] = time.monotonic() + duration
+    middleware.reset()
+    ready.wait()
+    started = time.monotonic()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - started
+    with middleware.lock:
+        middleware._tick(0)
+        busy = middleware.busy_seconds
+
+    latencies.sort()
+    return {
+        'endpoint': name,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput': len(latencies) / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'utilisation': busy / (wall * concurrency) if wall else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', default='EmailGen:app', help='module:attribute of the Flask app')
+    parser.add_argument('--endpoints', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per endpoint')
+    parser.add_argument('--latency', type=float, default=0.02, help='fake upstream latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    args = parser.parse_args()
+
+    config = fake_mailslurp.FakeConfig(latency=args.latency, jitter=args.jitter,
+                                       error_rate=args.error_rate, error_status=args.error_status)
+    fake, fake_url = fake_mailslurp.start_in_thread(config)
+    os.environ['MAILSLURP_HOST'] = fake_url
+    # The stand-in has no rate limit of its own
+    os.environ.setdefault('INBOX_CREATE_RATE', '0')
+
+    module_name, attr = args.app.split(':')
+    app = getattr(importlib.import_module(module_name), attr)
+    middleware = UtilisationMiddleware(app.wsgi_app)
+    app.wsgi_app = middleware
+
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    if not args.json:
+        print(f"app on :{port}, fake MailSlurp on {fake_url}, concurrency {args.concurrency}")
+        print(f"{'endpoint':<20}{'reqs':>8}{'errs':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+              f"{'p99 ms':>9}{'util':>7}")
+    broken = []
+    for name in args.endpoints:
+        result = drive(name, port, fake.state, middleware, args.concurrency, args.duration)
+        if result['errors'] == result['requests']:
+            broken.append(name)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{name:<20}{result['requests']:>8}{result['errors']:>6}{result['throughput']:>9.1f}"
+                  f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                  f"{result['utilisation']:>7.0%}")
+    server.shutdown()
+    if broken:
+        # Timings of requests that all failed measure nothing
+        sys.exit(f"Every request failed for: {', '.join(broken)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Open thousands of idle SSE subscriptions and chart server RSS against them.
+
+All connections are driven from one thread with non-blocking sockets, so
+the client is never the bottleneck. Start the app evented, for example
+
+    python serve_evented.py --port 5000
+
+then run
+
+    python benchmarks/sse_load.py --url http://127.0.0.1:5000 --pid <worker pid> \\
+        --connections 5000 --step 500
+
+Raise the open-files limit (ulimit -n) on both sides first.
+"""
+import time
+import socket
+import argparse
+import selectors
+from urllib.parse import urlsplit
+
+
+def rss_kib(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def open_stream(host, port, path, api_key):
+    sock = socket.create_connection((host, port))
+    sock.setblocking(False)
+    request = (f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nX-API-Key: {api_key}\r\n"
+               "Accept: text/event-stream\r\nConnection: keep-alive\r\n\r\n")
+    sock.sendall(request.encode('ascii'))
+    return sock
+
+
+def drain(selector, timeout):
+    """Read whatever the server sent; returns (bytes read, connections closed)."""
+    received = closed = 0
+    for key, _ in selector.select(timeout):
+        try:
+            data = key.fileobj.recv(65536)
+        except BlockingIOError:
+            continue
+        except OSError:
+            data = b''
+        if not data:
+            selector.unregister(key.fileobj)
+            key.fileobj.close()
+            closed += 1
+        received += len(data)
+    return received, closed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--pid', type=int, required=True, help='server worker pid to sample')
+    parser.add_argument('--connections', type=int, default=2000)
+    parser.add_argument('--step', type=int, default=250)
+    parser.add_argument('--settle', type=float, default=2.0, help='seconds to idle after each step')
+    parser.add_argument('--api-key', default='load-test-key')
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    selector = selectors.DefaultSelector()
+    baseline = rss_kib(args.pid)
+    opened = closed = 0
+
+    print(f"{'connections':>12}{'rss MiB':>10}{'KiB/conn':>10}{'closed':>8}")
+    print(f"{0:>12}{baseline / 1024:>10.1f}{'-':>10}{0:>8}")
+    while opened < args.connections:
+        for _ in range(min(args.step, args.connections - opened)):
+            inbox_id = f'load-inbox-{opened}'
+            sock = open_stream(host, port, f'/api/inboxes/{inbox_id}/events', args.api_key)
+            selector.register(sock, selectors.EVENT_READ)
+            opened += 1
+            drain(selector, 0)
+        deadline = time.monotonic() + args.settle
+        while time.monotonic() < deadline:
+            closed += drain(selector, 0.1)[1]
+        rss = rss_kib(args.pid)
+        live = opened - closed
+        per_conn = (rss - baseline) / live if live else 0
+        print(f"{live:>12}{rss / 1024:>10.1f}{per_conn:>10.1f}{closed:>8}")
+
+    for key in list(selector.get_map().values()):
+        key.fileobj.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Build the front-end assets served from static/.
+
+    python build_assets.py
+
+Compiles frontend/app.css with the Tailwind standalone CLI into a minified
+static/css/app.css holding only the utilities templates/ and static/js use,
+and cuts Font Awesome down to the icons they use (static/css/icons.css plus
+the solid webfont). Needs the CLI (`pip install tailwindcss-bin`, or set
+TAILWINDCSS to its path) and `pip install fontawesomefree==6.0.0`. The
+outputs are committed, so running the app needs neither.
+"""
+import os
+import re
+import sys
+import shutil
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC = os.path.join(ROOT, 'static')
+SOURCES = [os.path.join(ROOT, 'templates'), os.path.join(STATIC, 'js')]
+TAILWINDCSS = os.environ.get('TAILWINDCSS', 'tailwindcss')
+
+_FA_CLASS = re.compile(r'\.fa-([a-z0-9-]+)')
+_KEYFRAMES = re.compile(r'^@(?:-webkit-)?keyframes\s+fa-([a-z0-9-]+)$')
+
+
+def source_text():
+    chunks = []
+    for directory in SOURCES:
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                with open(os.path.join(dirpath, filename), encoding='utf-8') as source:
+                    chunks.append(source.read())
+    return '\n'.join(chunks)
+
+
+def build_tailwind():
+    output = os.path.join(STATIC, 'css', 'app.css')
+    subprocess.run([TAILWINDCSS, '--input', os.path.join(ROOT, 'frontend', 'app.css'),
+                    '--output', output, '--minify'], cwd=ROOT, check=True)
+    return output
+
+
+def _top_level_rules(css):
+    """Split a stylesheet into (selector text, full rule) at brace depth zero."""
+    rules, depth, start = [], 0, 0
+    for index, char in enumerate(css):
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                rule = css[start:index + 1].strip()
+                rules.append((rule[:rule.index('{')].strip(), rule))
+                start = index + 1
+    return rules
+
+
+def _purge(css, used):
+    """Drop rules and keyframes that only concern fa-* classes the page never uses."""
+    kept = []
+    for selector, rule in _top_level_rules(css):
+        keyframes = _KEYFRAMES.match(selector)
+        if keyframes:
+            if keyframes.group(1) in used:
+                kept.append(rule)
+        elif selector.startswith('@media'):
+            inner = _purge(rule[rule.index('{') + 1:-1], used)
+            if inner:
+                kept.append(selector + ' {\n' + '\n'.join(inner) + '\n}')
+        else:
+            # Selectors without an fa-* class (.fa, .fas, :root) always stay
+            classes = [_FA_CLASS.findall(s) for s in selector.split(',')]
+            if all(classes) and not any(name in used for names in classes for name in names):
+                continue
+            kept.append(rule)
+    return kept
+
+
+def _minify(css):
+    css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};:,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip() + '\n'
+
+
+def build_icons(used):
+    import fontawesomefree
+    package = os.path.join(os.path.dirname(fontawesomefree.__file__), 'static', 'fontawesomefree')
+    with open(os.path.join(package, 'css', 'fontawesome.css'), encoding='utf-8') as core:
+        core_css = core.read()
+    with open(os.path.join(package, 'css', 'solid.css'), encoding='utf-8') as solid:
+        solid_css = solid.read()
+    banner = re.match(r'/\*!.*?\*/', core_css, flags=re.S).group(0)
+
+    kept = _purge(re.sub(r'/\*.*?\*/', '', core_css, flags=re.S), used)
+    # Only the woff2 face is shipped; every browser that runs the page reads it
+    solid_css = re.sub(r'src:[^;]*;', 'src: url("../webfonts/fa-solid-900.woff2") format("woff2");',
+                       re.sub(r'/\*.*?\*/', '', solid_css, flags=re.S))
+
+    output = os.path.join(STATIC, 'css', 'icons.css')
+    with open(output, 'w', encoding='utf-8') as out:
+        out.write(banner + '\n' + _minify('\n'.join(kept) + '\n' + solid_css))
+    fonts = os.path.join(STATIC, 'webfonts')
+    os.makedirs(fonts, exist_ok=True)
+    shutil.copyfile(os.path.join(package, 'webfonts', 'fa-solid-900.woff2'),
+                    os.path.join(fonts, 'fa-solid-900.woff2'))
+    shutil.copyfile(os.path.join(package, 'LICENSE.txt'), os.path.join(fonts, 'LICENSE.txt'))
+    return output
+
+
+def main():
+    text = source_text()
+    used = set(re.findall(r'\bfa-([a-z0-9-]+)', text))
+    for path in (build_tailwind(), build_icons(used)):
+        print(f"{os.path.relpath(path, ROOT)}: {os.path.getsize(path)} bytes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
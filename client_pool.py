@@ -0,0 +1,109 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from lazy_mailslurp import mailslurp_client
+from metrics import registry, instrument_api_client, timed_phase
+from upstream_gateway import install_gateway
+
+logger = logging.getLogger(__name__)
+
+# Tunables (override through the environment)
+MAX_CLIENTS = int(os.environ.get('MAILSLURP_CLIENT_CACHE_SIZE', '256'))
+IDLE_TIMEOUT = float(os.environ.get('MAILSLURP_CLIENT_IDLE_TIMEOUT', '600'))
+POOL_MAXSIZE = int(os.environ.get('MAILSLURP_POOL_MAXSIZE', '16'))
+MAILSLURP_HOST = os.environ.get('MAILSLURP_HOST')
+
+
+class ClientPool:
+    """Thread-safe LRU of MailSlurp ApiClients keyed by API key.
+
+    Each ApiClient owns a urllib3 pool manager, so reusing one per key keeps
+    keep-alive connections (and their TLS sessions) warm across requests.
+    """
+
+    def __init__(self, max_size=MAX_CLIENTS, idle_timeout=IDLE_TIMEOUT,
+                 pool_maxsize=POOL_MAXSIZE, host=MAILSLURP_HOST):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.pool_maxsize = pool_maxsize
+        self.host = host
+        self._clients = OrderedDict()  # api_key -> (client, last_used)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _build(self, api_key):
+        with timed_phase('client_build'):
+            configuration = mailslurp_client.Configuration()
+            configuration.api_key['x-api-key'] = api_key
+            configuration.connection_pool_maxsize = self.pool_maxsize
+            if self.host:
+                configuration.host = self.host
+            # The gateway wraps the instrumented call, so every retry is timed
+            return install_gateway(instrument_api_client(mailslurp_client.ApiClient(configuration)))
+
+    def get(self, api_key):
+        """Return the shared ApiClient for `api_key`, creating it on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            stale = self._evict_idle(now)
+            entry = self._clients.get(api_key)
+            if entry is not None:
+                self._clients.move_to_end(api_key)
+                self._clients[api_key] = (entry[0], now)
+                self.hits += 1
+                client = entry[0]
+            else:
+                self.misses += 1
+                client = self._build(api_key)
+                self._clients[api_key] = (client, now)
+                while len(self._clients) > self.max_size:
+                    _, (old, _) = self._clients.popitem(last=False)
+                    stale.append(old)
+                    self.evictions += 1
+        for old in stale:
+            self._close(old)
+        return client
+
+    def _evict_idle(self, now):
+        # Caller holds the lock; oldest entries sit at the front.
+        stale = []
+        while self._clients:
+            api_key, (client, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._clients[api_key]
+            stale.append(client)
+            self.evictions += 1
+        return stale
+
+    @staticmethod
+    def _close(client):
+        # In-flight calls keep their own reference, so clearing the pool only
+        # drops idle sockets.
+        try:
+            client.rest_client.pool_manager.clear()
+        except Exception as e:
+            logger.debug(f"Error closing MailSlurp client: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._clients),
+                'maxSize': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+client_pool = ClientPool()
+registry.register_stats('emailgen_client_pool', client_pool.stats)
+
+
+def get_api_client(api_key):
+    return client_pool.get(api_key)
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from flask import Blueprint, request, jsonify
+
+from client_pool import get_api_client
+from lazy_mailslurp import mailslurp_client, ApiException
+from metrics import registry
+import state_backend
+
+logger = logging.getLogger(__name__)
+
+MAX_BYTES = int(os.environ.get('EMAIL_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+TTL = float(os.environ.get('EMAIL_CACHE_TTL', '3600'))
+# Encoded entries at least this large are stored zlib-compressed
+COMPRESS_MIN_BYTES = int(os.environ.get('EMAIL_CACHE_COMPRESS_MIN_BYTES', '2048'))
+# Path of an optional SQLite file that keeps cached emails across restarts. With
+# STATE_BACKEND=sqlite it defaults to the state database, so workers share entries.
+DB_PATH = os.environ.get('EMAIL_CACHE_DB') or (
+    state_backend.DB_PATH if state_backend.BACKEND == 'sqlite' else None)
+
+
+def email_to_dict(email):
+    """Shape an upstream Email model the way the UI's displayEmail() expects."""
+    created_at = email.created_at
+    return {
+        'success': True,
+        'id': email.id,
+        'inboxId': email.inbox_id,
+        'from': email._from,
+        'to': email.to,
+        'subject': email.subject,
+        'body': email.body,
+        'createdAt': created_at.isoformat() if hasattr(created_at, 'isoformat') else created_at,
+    }
+
+
+def key_digest(api_key):
+    """Entries remember which API key fetched them; only that key may read them."""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]
+
+
+def _encode(email):
+    raw = json.dumps(email, separators=(',', ':')).encode('utf-8')
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return b'z' + packed
+    return b'j' + raw
+
+
+def _decode(blob):
+    if blob[:1] == b'z':
+        return json.loads(zlib.decompress(blob[1:]))
+    return json.loads(blob[1:])
+
+
+class _SqliteTier:
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._writes = 0
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS emails ('
+                ' email_id TEXT PRIMARY KEY, inbox_id TEXT, owner TEXT,'
+                ' blob BLOB NOT NULL, expires_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS emails_expires ON emails (expires_at)')
+        self.prune()
+
+    def _connection(self):
+        # Caller holds the lock; reopened after fork() so workers never share one
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, email_id):
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT owner, blob FROM emails WHERE email_id = ? AND expires_at > ?',
+                (email_id, time.time())).fetchone()
+        return row
+
+    def put(self, email_id, inbox_id, owner, blob):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO emails VALUES (?, ?, ?, ?, ?)',
+                (email_id, inbox_id, owner, blob, time.time() + self.ttl))
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM emails WHERE expires_at <= ?', (time.time(),))
+
+    def prune(self):
+        with self._lock:
+            return self._connection().execute('DELETE FROM emails WHERE expires_at <= ?',
+                                      (time.time(),)).rowcount
+
+
+class EmailCache:
+    """In-process cache of fetched emails keyed by email ID.
+
+    Entries are stored as compact encoded bytes (zlib for large bodies) and
+    evicted LRU once their total size passes `max_bytes`, or after `ttl`
+    seconds. With `db_path` set, every entry is also written to SQLite so a
+    restarted process starts warm.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES, ttl=TTL, db_path=DB_PATH):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # email_id -> (owner, inbox_id, blob, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk = _SqliteTier(db_path, ttl) if db_path else None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    def put(self, api_key, email):
+        owner = key_digest(api_key)
+        blob = _encode(email)
+        self._store(email['id'], owner, email.get('inboxId'), blob)
+        if self._disk is not None:
+            try:
+                self._disk.put(email['id'], email.get('inboxId'), owner, blob)
+            except sqlite3.Error as e:
+                logger.warning(f"Email cache disk write failed: {e}")
+
+    def _store(self, email_id, owner, inbox_id, blob):
+        with self._lock:
+            old = self._entries.pop(email_id, None)
+            if old is not None:
+                self._bytes -= len(old[2])
+            self._entries[email_id] = (owner, inbox_id, blob, time.monotonic() + self.ttl)
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, email_id):
+        # Caller holds the lock
+        _, _, blob, _ = self._entries.pop(email_id)
+        self._bytes -= len(blob)
+
+    def get(self, api_key, email_id):
+        """Return the cached email dict, or None on a miss or owner mismatch."""
+        owner = key_digest(api_key)
+        with self._lock:
+            entry = self._entries.get(email_id)
+            if entry is not None and entry[3] <= time.monotonic():
+                self._drop(email_id)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(email_id)
+                if entry[0] == owner:
+                    self.hits += 1
+                    blob = entry[2]
+                else:
+                    self.misses += 1
+                    return None
+        if entry is not None:
+            return _decode(blob)
+
+        row = self._disk.get(email_id) if self._disk is not None else None
+        if row is None or row[0] != owner:
+            with self._lock:
+                self.misses += 1
+            return None
+        email = _decode(row[1])
+        self._store(email_id, row[0], email.get('inboxId'), row[1])
+        with self._lock:
+            self.disk_hits += 1
+        return email
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'diskHits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk': self._disk is not None,
+            }
+
+
+email_cache = EmailCache()
+registry.register_stats('emailgen_email_cache', email_cache.stats)
+
+
+def get_email(api_key, email_id):
+    """Cached email lookup that falls back to MailSlurp and fills the cache."""
+    email = email_cache.get(api_key, email_id)
+    if email is None:
+        email_api = mailslurp_client.EmailControllerApi(get_api_client(api_key))
+        email = email_to_dict(email_api.get_email(email_id))
+        email_cache.put(api_key, email)
+    return email
+
+
+emails_bp = Blueprint('emails', __name__)
+
+
+@emails_bp.route('/api/get_email', methods=['POST'])
+def get_email_route():
+    data = request.get_json(silent=True) or {}
+    api_key = data.get('apiKey')
+    email_id = data.get('emailId')
+    if not api_key or not email_id:
+        return jsonify({'error': 'API key and email ID are required'}), 400
+
+    try:
+        return jsonify(get_email(api_key, email_id))
+    except ApiException as e:
+        logger.error(f"MailSlurp API error fetching email {email_id}: {e}")
+        return jsonify({'error': f'MailSlurp API error: {e.reason}'}), e.status or 502
+    except Exception as e:
+        logger.error(f"Unexpected error fetching email {email_id}: {e}")
+        return jsonify({'error': f'MailSlurp request failed: {e}'}), 502
+
+
+@emails_bp.route('/api/email_cache', methods=['GET'])
+def email_cache_stats():
+    return jsonify(email_cache.stats())
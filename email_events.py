@@ -0,0 +1,211 @@
+import os
+import json
+import queue
+import base64
+import hashlib
+import logging
+import secrets
+import threading
+
+from flask import Blueprint, Response, request, jsonify
+
+from inbox_watcher import inbox_watcher
+from metrics import registry
+from state_backend import state
+
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = float(os.environ.get('EVENTS_HEARTBEAT_INTERVAL', '15'))
+# How long each underlying watch runs before it is re-armed
+WATCH_TIMEOUT = int(os.environ.get('EVENTS_WATCH_TIMEOUT', '300'))
+MAX_QUEUED_EVENTS = 100
+# Lifetime of a subscription token; EventSource reconnects reuse it until then
+TOKEN_TTL = float(os.environ.get('EVENTS_TOKEN_TTL', '60'))
+TOKEN_BYTES = 32
+
+
+class EventHub:
+    """Pushes new emails to every subscriber of an inbox.
+
+    Each subscribed inbox holds one InboxWatcher future that re-arms itself
+    from its done-callback, so an idle subscription costs a queue and a
+    suspended generator rather than a polling thread. The watch is withdrawn
+    as soon as the last subscriber leaves, so nothing keeps consuming the
+    inbox's emails for nobody. Serve the app with serve_evented.py (or
+    gunicorn -k gevent) so open streams do not each pin an OS thread either.
+    """
+
+    def __init__(self, watcher=inbox_watcher, watch_timeout=WATCH_TIMEOUT):
+        self.watcher = watcher
+        self.watch_timeout = watch_timeout
+        self._subscribers = {}  # (api_key, inbox_id) -> set of queues
+        self._futures = {}  # (api_key, inbox_id) -> the armed watch() future
+        self._lock = threading.Lock()
+
+    def subscribe(self, api_key, inbox_id):
+        events = queue.Queue(maxsize=MAX_QUEUED_EVENTS)
+        key = (api_key, inbox_id)
+        with self._lock:
+            subscribers = self._subscribers.get(key)
+            if subscribers is None:
+                subscribers = self._subscribers[key] = set()
+                arm = True
+            else:
+                arm = False
+            subscribers.add(events)
+        if arm:
+            self._arm(key)
+        return events
+
+    def unsubscribe(self, api_key, inbox_id, events):
+        key = (api_key, inbox_id)
+        future = None
+        with self._lock:
+            subscribers = self._subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(events)
+                if not subscribers:
+                    del self._subscribers[key]
+                    future = self._futures.pop(key, None)
+        if future is not None:
+            self.watcher.unwatch(api_key, inbox_id, future)
+            # Emails queued for a stream that closed before sending them are
+            # already marked read upstream; keep them for the next waiter
+            while True:
+                try:
+                    event, result = events.get_nowait()
+                except queue.Empty:
+                    break
+                if event == 'email':
+                    self.watcher.hold(api_key, inbox_id, result)
+
+    def _arm(self, key):
+        future = self.watcher.watch(key[0], key[1], self.watch_timeout)
+        with self._lock:
+            armed = key in self._subscribers
+            if armed:
+                self._futures[key] = future
+        if not armed:
+            # The last subscriber left while the watch was being set up
+            self.watcher.unwatch(key[0], key[1], future)
+            return
+        future.add_done_callback(lambda f: self._on_result(key, f))
+
+    def _on_result(self, key, future):
+        if future.cancelled():
+            return
+        result = future.result()
+        with self._lock:
+            current = self._futures.get(key) is future
+            if current:
+                del self._futures[key]
+            subscribers = list(self._subscribers.get(key, ()))
+        if not current:
+            # Unsubscribed before this landed. The email is already marked read
+            # upstream, so keep it for the next waiter unless a newer
+            # subscription's own watch received it too.
+            if result.get('success') and not subscribers:
+                self.watcher.hold(key[0], key[1], result)
+            return
+        if not result.get('timeout'):
+            event = 'email' if result.get('success') else 'inbox-error'
+            for events in subscribers:
+                try:
+                    events.put_nowait((event, result))
+                except queue.Full:
+                    logger.warning(f"Dropping {event} event for slow subscriber on {key[1]}")
+        self._arm(key)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+event_hub = EventHub()
+registry.register_stats('emailgen_events', lambda: {'subscribers': event_hub.subscriber_count()})
+
+
+def _token_digest(inbox_id, pad):
+    return hashlib.sha256(inbox_id.encode('utf-8') + b'\0' + pad).hexdigest()
+
+
+def _xor(data, pad):
+    return bytes(a ^ b for a, b in zip(data, pad))
+
+
+def issue_token(api_key, inbox_id):
+    """A short-lived token that stands in for `api_key` on `inbox_id`'s event stream.
+
+    The token is a random pad and the state backend keeps only the key
+    XORed with it, under a digest of the pad: neither a logged URL nor the
+    stored value reveals the key on its own.
+    """
+    key = api_key.encode('utf-8')
+    pad = secrets.token_bytes(max(TOKEN_BYTES, len(key)))
+    state.put_token(_token_digest(inbox_id, pad), _xor(key.ljust(len(pad), b'\0'), pad), TOKEN_TTL)
+    return base64.urlsafe_b64encode(pad).rstrip(b'=').decode('ascii')
+
+
+def redeem_token(token, inbox_id):
+    """The API key behind a live token for `inbox_id`, or None."""
+    try:
+        pad = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    except ValueError:
+        return None
+    if len(pad) < TOKEN_BYTES:
+        return None
+    sealed = state.get_token(_token_digest(inbox_id, pad))
+    if sealed is None or len(sealed) != len(pad):
+        return None
+    return _xor(sealed, pad).rstrip(b'\0').decode('utf-8')
+
+
+def _format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+events_bp = Blueprint('events', __name__)
+
+
+@events_bp.route('/api/inboxes/<inbox_id>/events/token', methods=['POST'])
+def inbox_events_token(inbox_id):
+    data = request.get_json(silent=True) or {}
+    api_key = data.get('apiKey')
+    if not api_key:
+        return jsonify({'error': 'API key is required'}), 400
+    return jsonify({'token': issue_token(api_key, inbox_id), 'expiresIn': TOKEN_TTL})
+
+
+@events_bp.route('/api/inboxes/<inbox_id>/events', methods=['GET'])
+def inbox_events(inbox_id):
+    # EventSource cannot send a body or custom headers, so browsers pass a
+    # token from /events/token in the query rather than the API key itself
+    api_key = request.headers.get('X-API-Key')
+    if not api_key:
+        token = request.args.get('token')
+        if not token:
+            return jsonify({'error': 'API key or subscription token is required'}), 400
+        api_key = redeem_token(token, inbox_id)
+        if api_key is None:
+            return jsonify({'error': 'Invalid or expired subscription token'}), 401
+
+    events = event_hub.subscribe(api_key, inbox_id)
+
+    def stream():
+        try:
+            yield _format_event('ready', {'inboxId': inbox_id})
+            while True:
+                try:
+                    event, data = events.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield _format_event(event, data)
+        finally:
+            event_hub.unsubscribe(api_key, inbox_id, events)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
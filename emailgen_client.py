@@ -0,0 +1,484 @@
+"""Asyncio client and CLI for driving EmailGen from scripts and CI.
+
+Creates inboxes, waits for their emails and extracts OTPs for many inboxes
+at once over a small pool of HTTP/1.1 keep-alive connections, using only the
+standard library. Each inbox's outcome is written as one NDJSON line the
+moment it finishes, and a throughput/latency report follows on stderr.
+
+    python emailgen_client.py run --url http://127.0.0.1:5000 --api-key $MAILSLURP_API_KEY \\
+        --inboxes 500 --concurrency 100 --extract-otp > results.ndjson
+
+Against the local stand-in instead of MailSlurp:
+
+    python fake_mailslurp.py --port 8089 --arrival-delay 2 &
+    MAILSLURP_HOST=http://127.0.0.1:8089 PORT=5000 python EmailGen.py &
+    python emailgen_client.py run --api-key test --inboxes 200 --extract-otp
+
+From Python:
+
+    async with EmailGenClient('http://127.0.0.1:5000', api_key) as client:
+        async for record in client.run(inboxes=50, concurrency=20, extract_otp=True):
+            print(record['otp'])
+"""
+import os
+import ssl
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+
+DEFAULT_URL = os.environ.get('EMAILGEN_URL', 'http://127.0.0.1:5000')
+# Largest batches the server accepts by default. Its inbox cap also shrinks
+# with INBOX_CREATE_RATE, so a refused batch reports maxCount and the client
+# adopts that
+CREATE_BATCH_MAX = 500
+OTP_BATCH_MAX = 1000
+
+
+class EmailGenError(Exception):
+    """An EmailGen endpoint answered with an error status."""
+
+    def __init__(self, status, message, body=None):
+        super().__init__(f'HTTP {status}: {message}')
+        self.status = status
+        self.message = message
+        self.body = body if isinstance(body, dict) else {}
+
+
+class ConnectionPool:
+    """HTTP/1.1 keep-alive connections to one server, at most `size` open at once.
+
+    Requests take an idle connection (or open one) and give it back when
+    the response has been read, so a run of thousands of requests reuses a
+    handful of sockets. A request that fails on a reused connection, which
+    the server may have closed while it sat idle, is retried once on a new
+    one.
+    """
+
+    def __init__(self, base_url, size=32, timeout=90.0):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.tls = url.scheme == 'https'
+        self.port = url.port or (443 if self.tls else 80)
+        self.host_header = url.netloc
+        self.base_path = url.path.rstrip('/')
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(size)
+        self._idle = []  # (reader, writer), most recently used last
+        self.opened = 0
+        self.requests = 0
+
+    async def request(self, method, path, payload=None):
+        """Send a JSON request; returns (status, decoded JSON body or None)."""
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8') if payload is not None else b''
+        head = (f'{method} {self.base_path}{path} HTTP/1.1\r\n'
+                f'Host: {self.host_header}\r\n'
+                'User-Agent: emailgen-client\r\n'
+                'Accept: application/json\r\n'
+                'Content-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n').encode('latin-1')
+        async with self._slots:
+            for attempt in (0, 1):
+                reused = bool(self._idle)
+                writer = None
+                try:
+                    reader, writer = self._idle.pop() if reused else await self._open()
+                    writer.write(head + body)
+                    status, keep_alive, data = await asyncio.wait_for(self._read_response(reader), self.timeout)
+                except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                    # OSError covers refused connections, resets and timeouts
+                    if writer is not None:
+                        writer.close()
+                    if reused and attempt == 0 and not isinstance(e, TimeoutError):
+                        continue
+                    raise EmailGenError(0, f'{method} {path} failed: {e!r}') from e
+                except BaseException:
+                    if writer is not None:
+                        writer.close()
+                    raise
+                if keep_alive:
+                    self._idle.append((reader, writer))
+                else:
+                    writer.close()
+                self.requests += 1
+                try:
+                    return status, json.loads(data) if data else None
+                except ValueError:
+                    return status, None
+
+    async def _open(self):
+        context = ssl.create_default_context() if self.tls else None
+        connection = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context), self.timeout)
+        self.opened += 1
+        return connection
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed before the response')
+        version, status = status_line.split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' and (version == b'HTTP/1.1' or connection == 'keep-alive')
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b''.join(chunks)
+        elif 'content-length' in headers:
+            data = await reader.readexactly(int(headers['content-length']))
+        else:
+            data = await reader.read()
+            keep_alive = False
+        return int(status), keep_alive, data
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
+
+
+class _OtpBatcher:
+    """Coalesces concurrent OTP lookups into /api/extract_otp/batch calls."""
+
+    def __init__(self, client, max_items=200, max_delay=0.01):
+        self.client = client
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self._pending = []  # (item, future)
+        self._timer = None
+        self._sending = set()  # batch tasks, referenced until they finish
+
+    async def extract(self, content, sender=None):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(({'content': content, 'from': sender}, future))
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch):
+        try:
+            results = await self.client.extract_otps([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class EmailGenClient:
+    """Async access to the EmailGen API for one MailSlurp API key."""
+
+    def __init__(self, base_url=DEFAULT_URL, api_key=None, connections=32, timeout=90.0):
+        self.api_key = api_key
+        self.pool = ConnectionPool(base_url, connections, timeout)
+        self._otp = _OtpBatcher(self)
+        self.create_batch_max = CREATE_BATCH_MAX
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.pool.close()
+
+    async def _call(self, method, path, payload=None, ok=(200,)):
+        status, body = await self.pool.request(method, path, payload)
+        if status not in ok:
+            message = None
+            if isinstance(body, dict):
+                # Batch endpoints list each failure under 'errors' instead
+                message = body.get('error') or '; '.join(dict.fromkeys(map(str, body.get('errors') or ())))
+            raise EmailGenError(status, message or 'Unexpected response', body)
+        return body
+
+    async def create_inboxes(self, count, concurrency=4):
+        """Create `count` inboxes, in as few batch calls as the server's cap allows."""
+        try:
+            body = await self._call('POST', '/api/inboxes/batch',
+                                    {'apiKey': self.api_key, 'count': count, 'concurrency': concurrency})
+        except EmailGenError as e:
+            limit = e.body.get('maxCount')
+            if e.status != 400 or not isinstance(limit, int) or not 0 < limit < count:
+                raise
+            # Remember the server's cap so later batches are sized to fit
+            self.create_batch_max = limit
+            inboxes, errors = [], []
+            for start in range(0, count, limit):
+                created, failed = await self.create_inboxes(min(limit, count - start), concurrency)
+                inboxes.extend(created)
+                errors.extend(failed)
+            return inboxes, errors
+        return body['inboxes'], body.get('errors', [])
+
+    async def submit_wait(self, inbox_id, timeout=60):
+        body = await self._call('POST', '/api/wait_email/submit',
+                                {'apiKey': self.api_key, 'inboxId': inbox_id, 'timeout': timeout}, ok=(202,))
+        return body['ticket']
+
+    async def wait_email(self, inbox_id, timeout=60, poll_min=0.2, poll_max=2.0):
+        """Wait for the next email in `inbox_id`; returns the server's result dict.
+
+        The wait is parked server-side and its ticket is polled, so no
+        connection is held for the whole wait and many waits share the pool.
+        """
+        ticket = await self.submit_wait(inbox_id, timeout)
+        delay = poll_min
+        while True:
+            await asyncio.sleep(delay)
+            result = await self._call('GET', f'/api/wait_email/{ticket}')
+            if not result.get('pending'):
+                return result
+            delay = min(poll_max, delay * 1.5)
+
+    async def extract_otps(self, emails):
+        """Batch OTP extraction; `emails` are strings or {'content', 'from'} dicts."""
+        results = []
+        for start in range(0, len(emails), OTP_BATCH_MAX):
+            body = await self._call('POST', '/api/extract_otp/batch',
+                                    {'emails': emails[start:start + OTP_BATCH_MAX]})
+            results.extend(body['results'])
+        return results
+
+    async def extract_otp(self, content, sender=None):
+        """One email's OTP; concurrent calls are sent together in batches."""
+        return await self._otp.extract(content, sender)
+
+    async def run(self, inboxes, concurrency=50, extract_otp=False, timeout=60, create_batch=50,
+                  include_body=False):
+        """Create `inboxes` inboxes and wait on them, yielding one record per inbox as it finishes.
+
+        Inboxes are created in batches of `create_batch` and flow straight
+        into waits, with at most `concurrency` inboxes in flight at once.
+        """
+        queue = asyncio.Queue()
+        records = asyncio.Queue()
+        in_flight = asyncio.Semaphore(concurrency)
+
+        async def create(count, started):
+            try:
+                created, errors = await self.create_inboxes(count, min(count, 16))
+            except EmailGenError as e:
+                created, errors = [], [e.message]
+            except Exception as e:
+                created, errors = [], [str(e) or type(e).__name__]
+            create_ms = (time.monotonic() - started) * 1000
+            for inbox in created:
+                queue.put_nowait((inbox, started, create_ms))
+            for i in range(count - len(created)):
+                in_flight.release()
+                error = errors[min(i, len(errors) - 1)] if errors else 'Inbox not created'
+                records.put_nowait({'inboxId': None, 'status': 'error', 'error': error,
+                                    'createMs': round(create_ms, 1)})
+
+        async def creator():
+            # Each inbox holds a slot from its creation until its record is out,
+            # and the next batch is requested as soon as slots free up for it
+            batches = []
+            remaining = inboxes
+            while remaining:
+                count = min(create_batch, remaining, concurrency, self.create_batch_max)
+                remaining -= count
+                for _ in range(count):
+                    await in_flight.acquire()
+                batches.append(asyncio.ensure_future(create(count, time.monotonic())))
+            await asyncio.gather(*batches)
+            for _ in range(concurrency):
+                queue.put_nowait(None)
+
+        async def process(inbox, started, create_ms):
+            record = {'inboxId': inbox['id'], 'emailAddress': inbox.get('emailAddress'),
+                      'createMs': round(create_ms, 1)}
+            wait_started = time.monotonic()
+            try:
+                result = await self.wait_email(inbox['id'], timeout)
+                record['waitMs'] = round((time.monotonic() - wait_started) * 1000, 1)
+                if result.get('success'):
+                    record.update(status='ok', emailId=result.get('id'), sender=result.get('from'),
+                                  subject=result.get('subject'))
+                    if include_body:
+                        record['body'] = result.get('body')
+                    if extract_otp:
+                        otp_started = time.monotonic()
+                        otp = await self.extract_otp(result.get('body') or '', result.get('from'))
+                        record.update(otp=otp['otp'], otpConfidence=otp['confidence'],
+                                      otpMs=round((time.monotonic() - otp_started) * 1000, 1))
+                elif result.get('timeout'):
+                    record.update(status='timeout')
+                else:
+                    record.update(status='error', error=result.get('error'))
+            except EmailGenError as e:
+                record.update(status='error', error=e.message)
+            except Exception as e:
+                # Connection resets, timeouts, malformed bodies: every inbox still
+                # gets its record, or run() would wait for it forever
+                record.update(status='error', error=str(e) or type(e).__name__)
+            record['totalMs'] = round((time.monotonic() - started) * 1000, 1)
+            return record
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                try:
+                    records.put_nowait(await process(*item))
+                finally:
+                    in_flight.release()
+
+        tasks = [asyncio.ensure_future(creator())]
+        tasks += [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        done = asyncio.ensure_future(asyncio.gather(*tasks))
+        try:
+            for _ in range(inboxes):
+                yield await records.get()
+        finally:
+            if not done.done():
+                done.cancel()
+            await asyncio.gather(done, return_exceptions=True)
+
+
+class Report:
+    """Throughput and per-phase latency of a run."""
+    PHASES = ('createMs', 'waitMs', 'otpMs', 'totalMs')
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.statuses = {}
+        self.otps_found = 0
+        self.samples = {phase: [] for phase in self.PHASES}
+
+    def add(self, record):
+        self.statuses[record['status']] = self.statuses.get(record['status'], 0) + 1
+        if record.get('otp'):
+            self.otps_found += 1
+        for phase in self.PHASES:
+            if record.get(phase) is not None:
+                self.samples[phase].append(record[phase])
+
+    @staticmethod
+    def _percentile(values, fraction):
+        return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))] if values else 0.0
+
+    def summary(self, pool):
+        wall = time.monotonic() - self.started
+        total = sum(self.statuses.values())
+        phases = {}
+        for phase, values in self.samples.items():
+            values = sorted(values)
+            if values:
+                phases[phase[:-2]] = {'p50': self._percentile(values, 0.50), 'p95': self._percentile(values, 0.95),
+                                      'p99': self._percentile(values, 0.99), 'max': values[-1]}
+        return {
+            'inboxes': total,
+            'statuses': self.statuses,
+            'otpsFound': self.otps_found,
+            'wallSeconds': round(wall, 3),
+            'inboxesPerSecond': round(total / wall, 2) if wall else 0.0,
+            'httpRequests': pool.requests,
+            'connectionsOpened': pool.opened,
+            'latencyMs': phases,
+        }
+
+    @staticmethod
+    def format(summary):
+        statuses = ', '.join(f'{count} {status}' for status, count in sorted(summary['statuses'].items()))
+        lines = [
+            f"{summary['inboxes']} inboxes in {summary['wallSeconds']:.2f}s "
+            f"({summary['inboxesPerSecond']:.1f}/s): {statuses or 'none'}; {summary['otpsFound']} OTPs found",
+            f"{summary['httpRequests']} HTTP requests over {summary['connectionsOpened']} connections",
+            f"{'phase':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+        ]
+        for phase, values in summary['latencyMs'].items():
+            lines.append(f"{phase:<8}{values['p50']:>10.1f}{values['p95']:>10.1f}"
+                         f"{values['p99']:>10.1f}{values['max']:>10.1f}")
+        return '\n'.join(lines)
+
+
+async def run_command(args):
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    report = Report()
+    try:
+        async with EmailGenClient(args.url, args.api_key, args.connections, args.request_timeout) as client:
+            async for record in client.run(args.inboxes, args.concurrency, args.extract_otp, args.timeout,
+                                           args.create_batch, args.include_body):
+                report.add(record)
+                output.write(json.dumps(record) + '\n')
+                output.flush()
+            summary = report.summary(client.pool)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    if args.report == 'json':
+        print(json.dumps(summary), file=sys.stderr)
+    elif args.report == 'text':
+        print(Report.format(summary), file=sys.stderr)
+    return 0 if summary['statuses'].get('ok', 0) == summary['inboxes'] else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='emailgen', description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='create inboxes, wait for their emails and (optionally) extract OTPs')
+    run.add_argument('--url', default=DEFAULT_URL, help='EmailGen base URL (env EMAILGEN_URL)')
+    run.add_argument('--api-key', default=os.environ.get('MAILSLURP_API_KEY'),
+                     help='MailSlurp API key (env MAILSLURP_API_KEY)')
+    run.add_argument('--inboxes', type=int, default=10)
+    run.add_argument('--concurrency', type=int, default=50, help='inboxes in flight at once')
+    run.add_argument('--connections', type=int, default=32, help='keep-alive connections to the server')
+    run.add_argument('--timeout', type=int, default=60, help='seconds to wait for each email')
+    run.add_argument('--request-timeout', type=float, default=90.0, help='seconds per HTTP request')
+    run.add_argument('--create-batch', type=int, default=50, help='inboxes per creation request')
+    run.add_argument('--extract-otp', action='store_true', help='extract an OTP from each email')
+    run.add_argument('--include-body', action='store_true', help='include email bodies in the output')
+    run.add_argument('--output', default='-', help='NDJSON output file (default stdout)')
+    run.add_argument('--report', choices=('text', 'json', 'none'), default='text',
+                     help='summary written to stderr at the end')
+    args = parser.parse_args(argv)
+    if not args.api_key:
+        parser.error('an API key is required (--api-key or MAILSLURP_API_KEY)')
+    if args.inboxes < 1 or args.concurrency < 1 or args.connections < 1 or args.create_batch < 1:
+        parser.error('--inboxes, --concurrency, --connections and --create-batch must be positive')
+    return asyncio.run(run_command(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
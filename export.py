@@ -0,0 +1,210 @@
+import io
+import csv
+import json
+import zlib
+import base64
+import logging
+from datetime import datetime, timezone
+
+from flask import Blueprint, Response, request, jsonify
+
+from client_pool import get_api_client
+from lazy_mailslurp import mailslurp_client, ApiException
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+# Bytes buffered before a chunk is handed to the WSGI server
+CHUNK_BYTES = 64 * 1024
+CSV_COLUMNS = ['type', 'inboxId', 'id', 'emailAddress', 'from', 'to', 'subject', 'createdAt', 'cursor', 'error']
+
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _as_utc(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def encode_cursor(page, offset):
+    raw = json.dumps([page, offset]).encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    page, offset = json.loads(raw)
+    return int(page), int(offset)
+
+
+class MailSlurpSource:
+    """Paged reads used by the exporter; swap in a fake to benchmark offline."""
+
+    def __init__(self, api_key):
+        api_client = get_api_client(api_key)
+        self.inboxes_api = mailslurp_client.InboxControllerApi(api_client)
+        self.emails_api = mailslurp_client.EmailControllerApi(api_client)
+
+    def inbox_page(self, page, size):
+        result = self.inboxes_api.get_all_inboxes(page=page, size=size, sort='ASC')
+        inboxes = [{'id': i.id, 'emailAddress': i.email_address, 'createdAt': i.created_at}
+                   for i in result.content or []]
+        return inboxes, bool(result.last)
+
+    def email_page(self, inbox_id, page, size):
+        result = self.emails_api.get_emails_paginated(
+            inbox_id=[inbox_id], page=page, size=size, sort='ASC')
+        emails = [{'id': e.id, 'inboxId': e.inbox_id, 'from': e._from, 'to': e.to,
+                   'subject': e.subject, 'createdAt': e.created_at}
+                  for e in result.content or []]
+        return emails, bool(result.last)
+
+
+def export_records(source, cursor=None, since=None, before=None, include_emails=True):
+    """Yield export records one at a time, so memory stays flat for any volume.
+
+    Inboxes are read oldest first. After each inbox a 'cursor' record marks
+    where to resume; pass it back as `cursor` to continue an interrupted export.
+    A final 'end' record marks a complete export. `since` and `before` bound
+    email times, so an older inbox is listed whenever it has emails in range.
+    """
+    yield from _inbox_records(source, cursor, _as_utc(since), _as_utc(before), include_emails)
+    yield {'type': 'end'}
+
+
+def _inbox_records(source, cursor, since, before, include_emails):
+    page, offset = decode_cursor(cursor) if cursor else (0, 0)
+    while True:
+        inboxes, last = source.inbox_page(page, PAGE_SIZE)
+        for index in range(offset, len(inboxes)):
+            inbox = inboxes[index]
+            created_at = _as_utc(inbox['createdAt'])
+            if before is not None and created_at is not None and created_at >= before:
+                return  # oldest first, so no later inbox can hold an earlier email
+            record = {'type': 'inbox', 'id': inbox['id'], 'emailAddress': inbox['emailAddress'],
+                      'createdAt': _iso(inbox['createdAt'])}
+            listed = since is None or created_at is None or created_at >= since
+            if listed:
+                yield record
+            if include_emails:
+                for email in _inbox_emails(source, inbox['id'], since, before):
+                    if not listed:
+                        yield record
+                        listed = True
+                    yield email
+            yield {'type': 'cursor', 'cursor': encode_cursor(page, index + 1)}
+        if last or not inboxes:
+            return
+        page, offset = page + 1, 0
+
+
+def _inbox_emails(source, inbox_id, since, before):
+    page = 0
+    while True:
+        emails, last = source.email_page(inbox_id, page, PAGE_SIZE)
+        for email in emails:
+            created_at = _as_utc(email['createdAt'])
+            if before is not None and created_at is not None and created_at >= before:
+                return
+            if since is None or created_at is None or created_at >= since:
+                yield dict(email, type='email', createdAt=_iso(email['createdAt']))
+        if last or not emails:
+            return
+        page += 1
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def csv_lines(records):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for record in records:
+        if isinstance(record.get('to'), list):
+            record = dict(record, to=';'.join(record['to']))
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def chunked(lines, compress=False):
+    """Coalesce lines into ~CHUNK_BYTES chunks, optionally gzip-compressed."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    pending, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        pending.append(data)
+        size += len(data)
+        if size >= CHUNK_BYTES:
+            chunk = b''.join(pending)
+            pending, size = [], 0
+            if compressor is not None:
+                chunk = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield chunk
+    chunk = b''.join(pending)
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def _guarded(records, cursor=None):
+    """End a failed export with an 'error' record holding the cursor to resume from.
+
+    Headers are already sent, so the status cannot change; the error record
+    (or a missing 'end' record) is how a client tells the export is incomplete.
+    """
+    try:
+        for record in records:
+            if record['type'] == 'cursor':
+                cursor = record['cursor']
+            yield record
+    except ApiException as e:
+        logger.error(f"MailSlurp API error during export: {e}")
+        yield {'type': 'error', 'error': f'MailSlurp API error: {e.reason}', 'cursor': cursor}
+    except Exception as e:
+        logger.error(f"Export aborted: {e}")
+        yield {'type': 'error', 'error': str(e), 'cursor': cursor}
+
+
+export_bp = Blueprint('export', __name__)
+
+
+@export_bp.route('/api/export', methods=['GET'])
+def export():
+    # Header only: a key in the query string would end up in access and proxy logs
+    api_key = request.headers.get('X-API-Key')
+    if not api_key:
+        return jsonify({'error': 'X-API-Key header is required'}), 400
+
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    try:
+        cursor = request.args.get('cursor')
+        if cursor:
+            decode_cursor(cursor)
+        since = _as_utc(request.args.get('since'))
+        before = _as_utc(request.args.get('before'))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor, since or before'}), 400
+    include_emails = request.args.get('emails', 'true').lower() not in ('0', 'false', 'no')
+
+    records = _guarded(export_records(MailSlurpSource(api_key), cursor, since, before, include_emails), cursor)
+    lines = ndjson_lines(records) if fmt == 'ndjson' else csv_lines(records)
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+    filename = f"mailslurp-export-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(chunked(lines, compress), mimetype=mimetype, headers=headers)
@@ -0,0 +1,365 @@
+"""Local MailSlurp stand-in for load tests and offline development.
+
+Speaks the subset of the MailSlurp REST API that mailslurp_client uses in
+this app, with configurable latency, jitter, error injection, a per-key rate
+limit (429 + Retry-After, like the real service) and email arrival schedules.
+Point the app at it with MAILSLURP_HOST:
+
+    python fake_mailslurp.py --port 8089 --latency 0.05 --arrival-delay 2
+    MAILSLURP_HOST=http://127.0.0.1:8089 PORT=5000 python EmailGen.py
+"""
+import re
+import json
+import math
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+logger = logging.getLogger(__name__)
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+class FakeConfig:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=500,
+                 retry_after=1, arrival_delay=None, arrival_jitter=0.0, emails_per_inbox=1,
+                 rate_limit=0.0, rate_burst=None):
+        self.latency = latency  # seconds added to every request
+        self.jitter = jitter  # extra uniform random seconds
+        self.error_rate = error_rate  # fraction of requests that fail
+        self.error_status = error_status  # 429 responses also carry Retry-After
+        self.retry_after = retry_after
+        self.arrival_delay = arrival_delay  # seconds after creation an email arrives; None = never
+        self.arrival_jitter = arrival_jitter
+        self.emails_per_inbox = emails_per_inbox
+        self.rate_limit = rate_limit  # requests per second per API key; 0 = unlimited
+        self.rate_burst = rate_burst if rate_burst is not None else max(1.0, rate_limit)
+
+
+class FakeState:
+    """Inboxes and emails per API key. Scheduled emails materialise lazily on read."""
+
+    def __init__(self, config):
+        self.config = config
+        self.inboxes = {}  # inbox_id -> inbox dict (with '_key')
+        self.emails = {}  # email_id -> email dict
+        self.inbox_emails = {}  # inbox_id -> [email_id] oldest first
+        self.scheduled = {}  # inbox_id -> [arrival monotonic time]
+        self.webhooks = {}  # inbox_id -> [webhook dict]
+        self.buckets = {}  # api_key -> (tokens, last refill)
+        self.cond = threading.Condition()
+        self.requests = 0
+        self.rate_limited = 0
+
+    def throttle(self, api_key):
+        """Seconds until `api_key` may call again, or 0 if this call is allowed."""
+        config = self.config
+        if config.rate_limit <= 0:
+            return 0
+        with self.cond:
+            now = time.monotonic()
+            tokens, last = self.buckets.get(api_key, (config.rate_burst, now))
+            tokens = min(config.rate_burst, tokens + (now - last) * config.rate_limit)
+            if tokens >= 1:
+                self.buckets[api_key] = (tokens - 1, now)
+                return 0
+            self.buckets[api_key] = (tokens, now)
+            self.rate_limited += 1
+            return (1 - tokens) / config.rate_limit
+
+    def create_inbox(self, api_key):
+        inbox_id = str(uuid.uuid4())
+        inbox = {'id': inbox_id, 'emailAddress': f'{inbox_id}@fake.mailslurp.test',
+                 'createdAt': _now_iso(), 'favourite': False, 'teamAccess': False,
+                 'inboxType': 'HTTP_INBOX', 'name': None, 'tags': [], 'userId': 'fake-user',
+                 'readOnly': False, '_key': api_key}
+        config = self.config
+        with self.cond:
+            self.inboxes[inbox_id] = inbox
+            self.inbox_emails[inbox_id] = []
+            if config.arrival_delay is not None:
+                now = time.monotonic()
+                self.scheduled[inbox_id] = sorted(
+                    now + config.arrival_delay * (i + 1) + random.uniform(0, config.arrival_jitter)
+                    for i in range(config.emails_per_inbox))
+        return inbox
+
+    def deliver(self, inbox_id, subject=None, body=None, sender='noreply@example.test'):
+        code = f'{random.randint(0, 999999):06d}'
+        email_id = str(uuid.uuid4())
+        with self.cond:
+            inbox = self.inboxes[inbox_id]
+            email = {'id': email_id, 'inboxId': inbox_id, 'from': sender,
+                     'to': [inbox['emailAddress']], 'cc': [], 'bcc': [], 'attachments': [],
+                     'subject': subject or f'Your verification code is {code}',
+                     'body': body or f'<p>Your verification code is <b>{code}</b>.</p>',
+                     'isHTML': True, 'read': False, 'teamAccess': False, 'userId': 'fake-user',
+                     'createdAt': _now_iso(), 'updatedAt': _now_iso()}
+            self.emails[email_id] = email
+            self.inbox_emails[inbox_id].append(email_id)
+            self.cond.notify_all()
+        return email
+
+    def materialise(self, inbox_id):
+        now = time.monotonic()
+        due = 0
+        with self.cond:
+            times = self.scheduled.get(inbox_id)
+            while times and times[0] <= now:
+                times.pop(0)
+                due += 1
+        for _ in range(due):
+            self.deliver(inbox_id)
+
+    def owned(self, api_key, inbox_id):
+        inbox = self.inboxes.get(inbox_id)
+        return inbox is not None and inbox['_key'] == api_key
+
+
+def _page(items, page, size):
+    start = page * size
+    content = items[start:start + size]
+    total_pages = (len(items) + size - 1) // size if size else 0
+    return {'content': content, 'number': page, 'size': size, 'numberOfElements': len(content),
+            'totalElements': len(items), 'totalPages': total_pages, 'first': page == 0,
+            'last': start + size >= len(items), 'empty': not content}
+
+
+def _flag(query, name):
+    return query.get(name, ['false'])[0].lower() == 'true'
+
+
+def _public(record):
+    return {k: v for k, v in record.items() if not k.startswith('_')}
+
+
+def _projection(email):
+    return {k: email[k] for k in ('id', 'inboxId', 'from', 'to', 'cc', 'bcc', 'subject',
+                                  'createdAt', 'read', 'attachments', 'teamAccess')}
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+    state = None  # set by make_server
+
+    ROUTES = [
+        ('POST', re.compile(r'^/inboxes(?:/withDefaults)?$'), 'create_inbox'),
+        ('GET', re.compile(r'^/inboxes/paginated$'), 'list_inboxes'),
+        ('GET', re.compile(r'^/inboxes/(?P<inbox_id>[^/]+)/emails/paginated$'), 'inbox_emails'),
+        ('POST', re.compile(r'^/inboxes/(?P<inbox_id>[^/]+)/webhooks$'), 'create_webhook'),
+        ('GET', re.compile(r'^/emails$'), 'list_emails'),
+        ('GET', re.compile(r'^/emails/(?P<email_id>[^/]+)$'), 'get_email'),
+        ('GET', re.compile(r'^/waitForLatestEmail$'), 'wait_for_latest'),
+        ('POST', re.compile(r'^/_fake/inboxes/(?P<inbox_id>[^/]+)/emails$'), 'inject_email'),
+        ('GET', re.compile(r'^/_fake/stats$'), 'fake_stats'),
+    ]
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send(self, status, payload=None, headers=None):
+        body = b'' if payload is None else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        state = self.state
+        config = state.config
+        with state.cond:
+            state.requests += 1
+
+        delay = config.latency + (random.uniform(0, config.jitter) if config.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if not url.path.startswith('/_fake/'):
+            wait = state.throttle(self.headers.get('x-api-key'))
+            if wait:
+                # Retry-After is whole seconds, as real servers send it
+                return self._send(429, {'message': 'Rate limit exceeded'},
+                                  {'Retry-After': str(math.ceil(wait))})
+            if random.random() < config.error_rate:
+                headers = {'Retry-After': str(config.retry_after)} if config.error_status == 429 else None
+                return self._send(config.error_status, {'message': 'Injected failure'}, headers)
+
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                api_key = self.headers.get('x-api-key')
+                if not api_key and not name.startswith(('inject', 'fake')):
+                    return self._send(401, {'message': 'Missing x-api-key'})
+                query = parse_qs(url.query)
+                body = json.loads(raw) if raw else None
+                return getattr(self, name)(api_key, query, body, **match.groupdict())
+        self._send(404, {'message': f'No fake route for {method} {url.path}'})
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    # Handlers
+
+    def create_inbox(self, api_key, query, body):
+        self._send(201, _public(self.state.create_inbox(api_key)))
+
+    def list_inboxes(self, api_key, query, body):
+        state = self.state
+        with state.cond:
+            inboxes = [_public(i) for i in state.inboxes.values() if i['_key'] == api_key]
+        if query.get('sort', ['ASC'])[0] == 'DESC':
+            inboxes.reverse()
+        page, size = int(query.get('page', [0])[0]), int(query.get('size', [20])[0])
+        self._send(200, _page(inboxes, page, size))
+
+    def _emails_for(self, api_key, inbox_ids, unread_only, sort):
+        state = self.state
+        for inbox_id in inbox_ids:
+            state.materialise(inbox_id)
+        with state.cond:
+            emails = [state.emails[e] for inbox_id in inbox_ids if state.owned(api_key, inbox_id)
+                      for e in state.inbox_emails[inbox_id]]
+        if unread_only:
+            emails = [e for e in emails if not e['read']]
+        emails.sort(key=lambda e: e['createdAt'], reverse=(sort == 'DESC'))
+        return emails
+
+    def list_emails(self, api_key, query, body):
+        state = self.state
+        inbox_ids = query.get('inboxId')
+        if inbox_ids is None:
+            with state.cond:
+                inbox_ids = [i for i, inbox in state.inboxes.items() if inbox['_key'] == api_key]
+        emails = self._emails_for(api_key, inbox_ids, _flag(query, 'unreadOnly'),
+                                  query.get('sort', ['ASC'])[0])
+        page, size = int(query.get('page', [0])[0]), int(query.get('size', [20])[0])
+        self._send(200, _page([_projection(e) for e in emails], page, size))
+
+    def inbox_emails(self, api_key, query, body, inbox_id):
+        if not self.state.owned(api_key, inbox_id):
+            return self._send(404, {'message': 'Inbox not found'})
+        emails = self._emails_for(api_key, [inbox_id], False, query.get('sort', ['ASC'])[0])
+        page, size = int(query.get('page', [0])[0]), int(query.get('size', [20])[0])
+        self._send(200, _page([_projection(e) for e in emails], page, size))
+
+    def get_email(self, api_key, query, body, email_id):
+        state = self.state
+        with state.cond:
+            email = state.emails.get(email_id)
+            if email is None or not state.owned(api_key, email['inboxId']):
+                return self._send(404, {'message': 'Email not found'})
+            email['read'] = True
+            payload = dict(email)
+        self._send(200, payload)
+
+    def wait_for_latest(self, api_key, query, body):
+        state = self.state
+        inbox_id = query.get('inboxId', [None])[0]
+        if not state.owned(api_key, inbox_id):
+            return self._send(404, {'message': 'Inbox not found'})
+        timeout = int(query.get('timeout', [60000])[0]) / 1000.0
+        unread_only = _flag(query, 'unreadOnly')
+        deadline = time.monotonic() + timeout
+        while True:
+            emails = self._emails_for(api_key, [inbox_id], unread_only, 'DESC')
+            if emails:
+                return self.get_email(api_key, query, body, emails[0]['id'])
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return self._send(408, {'message': 'Timed out waiting for email'})
+            with state.cond:
+                state.cond.wait(min(remaining, 0.1))
+
+    def create_webhook(self, api_key, query, body, inbox_id):
+        state = self.state
+        if not state.owned(api_key, inbox_id):
+            return self._send(404, {'message': 'Inbox not found'})
+        webhook = {'id': str(uuid.uuid4()), 'inboxId': inbox_id, 'url': (body or {}).get('url'),
+                   'name': (body or {}).get('name'), 'basicAuth': bool((body or {}).get('basicAuth')),
+                   'method': 'POST', 'eventName': 'EMAIL_RECEIVED',
+                   'createdAt': _now_iso(), 'updatedAt': _now_iso()}
+        with state.cond:
+            state.webhooks.setdefault(inbox_id, []).append(webhook)
+        self._send(201, webhook)
+
+    def inject_email(self, api_key, query, body, inbox_id):
+        if inbox_id not in self.state.inboxes:
+            return self._send(404, {'message': 'Inbox not found'})
+        body = body or {}
+        email = self.state.deliver(inbox_id, body.get('subject'), body.get('body'),
+                                   body.get('from', 'noreply@example.test'))
+        self._send(201, email)
+
+    def fake_stats(self, api_key, query, body):
+        state = self.state
+        with state.cond:
+            self._send(200, {'requests': state.requests, 'rateLimited': state.rate_limited,
+                             'inboxes': len(state.inboxes), 'emails': len(state.emails)})
+
+
+def make_server(host='127.0.0.1', port=0, config=None):
+    """Build (but do not start) a fake server; port 0 picks a free port."""
+    handler = type('BoundFakeHandler', (FakeHandler,), {'state': FakeState(config or FakeConfig())})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = handler.state
+    return server
+
+
+def start_in_thread(config=None, host='127.0.0.1', port=0):
+    """Start a fake server on a daemon thread; returns (server, base_url)."""
+    server = make_server(host, port, config)
+    threading.Thread(target=server.serve_forever, name='fake-mailslurp', daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--arrival-delay', type=float, default=None,
+                        help='seconds after inbox creation that each email arrives')
+    parser.add_argument('--arrival-jitter', type=float, default=0.0)
+    parser.add_argument('--emails-per-inbox', type=int, default=1)
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='requests per second allowed per API key (429 beyond it)')
+    parser.add_argument('--rate-burst', type=float, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = FakeConfig(args.latency, args.jitter, args.error_rate, args.error_status,
+                        args.retry_after, args.arrival_delay, args.arrival_jitter,
+                        args.emails_per_inbox, args.rate_limit, args.rate_burst)
+    server = make_server(args.host, args.port, config)
+    logger.info(f"Fake MailSlurp listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
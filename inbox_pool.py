@@ -0,0 +1,237 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, request, jsonify
+
+from client_pool import get_api_client
+from lazy_mailslurp import mailslurp_client, ApiException
+from metrics import registry
+from state_backend import state
+from upstream_gateway import RateLimiter
+from webhooks import register_webhook
+
+logger = logging.getLogger(__name__)
+
+# Ready inboxes kept per API key; 0 disables the background pool
+POOL_SIZE = int(os.environ.get('INBOX_POOL_SIZE', '0'))
+# Stop refilling a key's pool once it has gone unused this long
+POOL_IDLE_TIMEOUT = float(os.environ.get('INBOX_POOL_IDLE_TIMEOUT', '900'))
+# Upstream inbox creations per second allowed per API key (refills and batches)
+CREATE_RATE = float(os.environ.get('INBOX_CREATE_RATE', '5'))
+REFILL_WORKERS = int(os.environ.get('INBOX_POOL_REFILL_WORKERS', '4'))
+BATCH_MAX_COUNT = int(os.environ.get('INBOX_BATCH_MAX_COUNT', '500'))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('INBOX_BATCH_MAX_CONCURRENCY', '16'))
+# A batch holds its request worker until every inbox exists, which at
+# INBOX_CREATE_RATE takes count / rate seconds; larger batches are refused
+BATCH_MAX_SECONDS = float(os.environ.get('INBOX_BATCH_MAX_SECONDS', '30'))
+
+
+def inbox_to_dict(inbox):
+    """Shape an upstream Inbox model the way the UI's createInbox() expects."""
+    created_at = inbox.created_at
+    return {
+        'id': inbox.id,
+        'emailAddress': inbox.email_address,
+        'createdAt': created_at.isoformat() if hasattr(created_at, 'isoformat') else created_at,
+    }
+
+
+def create_upstream_inbox(api_key):
+    inbox = mailslurp_client.InboxControllerApi(get_api_client(api_key)).create_inbox()
+    register_webhook(api_key, inbox.id)
+    return inbox_to_dict(inbox)
+
+
+class InboxPool:
+    """Keeps `size` pre-provisioned inboxes ready per API key.
+
+    Keys join the pool the first time they ask for an inbox; a background
+    executor tops each pool back up after every take, throttled by the
+    shared per-key RateLimiter so refills never exceed the upstream budget.
+    """
+
+    def __init__(self, size=POOL_SIZE, create=create_upstream_inbox,
+                 limiter=None, workers=REFILL_WORKERS, idle_timeout=POOL_IDLE_TIMEOUT):
+        self.size = size
+        self.create = create
+        self.limiter = limiter or RateLimiter(CREATE_RATE)
+        self.idle_timeout = idle_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='inbox-refill')
+        self._ready = {}  # api_key -> deque of inbox dicts
+        self._refilling = {}  # api_key -> refills in flight
+        self._last_used = {}  # api_key -> monotonic time of last take
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.refill_errors = 0
+        self.refill_seconds = 0.0
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def take(self, api_key):
+        """Pop a ready inbox for `api_key`, or None when the pool is empty."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._last_used[api_key] = time.monotonic()
+            ready = self._ready.setdefault(api_key, deque())
+            inbox = ready.popleft() if ready else None
+            if inbox is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._schedule_refill(api_key)
+        return inbox
+
+    def _schedule_refill(self, api_key):
+        # Caller holds the lock
+        missing = self.size - len(self._ready[api_key]) - self._refilling.get(api_key, 0)
+        for _ in range(max(0, missing)):
+            self._refilling[api_key] = self._refilling.get(api_key, 0) + 1
+            self._executor.submit(self._refill_one, api_key)
+
+    def _refill_one(self, api_key):
+        inbox = None
+        try:
+            with self._lock:
+                idle = time.monotonic() - self._last_used.get(api_key, 0) > self.idle_timeout
+            if not idle:
+                self.limiter.acquire(api_key)
+                started = time.monotonic()
+                inbox = self.create(api_key)
+                elapsed = time.monotonic() - started
+        except ApiException as e:
+            logger.warning(f"Inbox pool refill failed: {e.status} {e.reason}")
+        except Exception as e:
+            logger.warning(f"Inbox pool refill failed: {e}")
+        with self._lock:
+            self._refilling[api_key] -= 1
+            if inbox is not None:
+                self._ready[api_key].append(inbox)
+                self.created += 1
+                self.refill_seconds += elapsed
+            elif not idle:
+                self.refill_errors += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'keys': len(self._ready),
+                'ready': sum(len(ready) for ready in self._ready.values()),
+                'refilling': sum(self._refilling.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'created': self.created,
+                'refillErrors': self.refill_errors,
+                'avgRefillSeconds': self.refill_seconds / self.created if self.created else 0.0,
+            }
+
+
+inbox_pool = InboxPool()
+registry.register_stats('emailgen_inbox_pool', inbox_pool.stats)
+
+
+def provision_inbox(api_key):
+    """Return a pre-provisioned inbox when one is ready, else create one upstream."""
+    inbox = inbox_pool.take(api_key)
+    if inbox is None:
+        inbox_pool.limiter.acquire(api_key)
+        inbox = create_upstream_inbox(api_key)
+    # Counted when handed out, so pool refills nobody has taken yet are not
+    state.incr('inboxesCreated')
+    return inbox
+
+
+def batch_limit(limiter=None):
+    """Largest batch whose upstream creations fit in BATCH_MAX_SECONDS at the create rate."""
+    limiter = limiter or inbox_pool.limiter
+    if limiter.rate <= 0:
+        return BATCH_MAX_COUNT
+    return max(1, min(BATCH_MAX_COUNT, int(limiter.burst + limiter.rate * BATCH_MAX_SECONDS)))
+
+
+def provision_inboxes(api_key, count, concurrency):
+    """Create `count` inboxes with at most `concurrency` upstream calls in flight."""
+    inboxes, errors = [], []
+    while len(inboxes) < count:
+        inbox = inbox_pool.take(api_key)
+        if inbox is None:
+            break
+        inboxes.append(inbox)
+
+    def create_one(_):
+        inbox_pool.limiter.acquire(api_key)
+        return create_upstream_inbox(api_key)
+
+    remaining = count - len(inboxes)
+    if remaining:
+        with ThreadPoolExecutor(max_workers=min(concurrency, remaining)) as executor:
+            futures = [executor.submit(create_one, i) for i in range(remaining)]
+            for future in futures:
+                try:
+                    inboxes.append(future.result())
+                except ApiException as e:
+                    errors.append(f'MailSlurp API error: {e.reason}')
+                except Exception as e:
+                    errors.append(str(e))
+    if inboxes:
+        state.incr('inboxesCreated', len(inboxes))
+    return inboxes, errors
+
+
+inboxes_bp = Blueprint('inboxes', __name__)
+
+
+@inboxes_bp.route('/api/create_inbox', methods=['POST'])
+def create_inbox():
+    data = request.get_json(silent=True) or {}
+    api_key = data.get('apiKey')
+    if not api_key:
+        return jsonify({'error': 'API key is required'}), 400
+
+    try:
+        return jsonify(provision_inbox(api_key))
+    except ApiException as e:
+        logger.error(f"MailSlurp API error creating inbox: {e}")
+        return jsonify({'error': f'MailSlurp API error: {e.reason}'}), e.status or 502
+    except Exception as e:
+        # e.g. MailSlurp unreachable; still answer JSON the UI can show, not an HTML 500
+        logger.error(f"Unexpected error creating inbox: {e}")
+        return jsonify({'error': f'MailSlurp request failed: {e}'}), 502
+
+
+@inboxes_bp.route('/api/inboxes/batch', methods=['POST'])
+def create_inbox_batch():
+    data = request.get_json(silent=True) or {}
+    api_key = data.get('apiKey')
+    if not api_key:
+        return jsonify({'error': 'API key is required'}), 400
+
+    try:
+        count = int(data.get('count', 1))
+        concurrency = int(data.get('concurrency', 4))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'count and concurrency must be integers'}), 400
+    max_count = batch_limit()
+    if not 1 <= count <= max_count:
+        return jsonify({'error': f'count must be between 1 and {max_count}', 'maxCount': max_count}), 400
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+
+    logger.info(f"Creating {count} inboxes (concurrency {concurrency})")
+    inboxes, errors = provision_inboxes(api_key, count, concurrency)
+    status = 200 if inboxes else 502
+    return jsonify({'inboxes': inboxes, 'count': len(inboxes), 'errors': errors}), status
+
+
+@inboxes_bp.route('/api/inboxes/pool', methods=['GET'])
+def inbox_pool_stats():
+    return jsonify(inbox_pool.stats())
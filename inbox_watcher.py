@@ -0,0 +1,312 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+
+from client_pool import get_api_client
+from email_cache import email_cache, email_to_dict, key_digest
+from lazy_mailslurp import mailslurp_client, ApiException
+from metrics import registry
+from state_backend import state, POLL_INTERVAL as SHARED_POLL_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.environ.get('WAIT_EMAIL_POLL_INTERVAL', '2'))
+SWEEP_WORKERS = int(os.environ.get('WAIT_EMAIL_CHECK_WORKERS', '8'))
+# Inbox IDs per upstream list call; keeps the query string a sane length
+BATCH_SIZE = int(os.environ.get('WAIT_EMAIL_BATCH_SIZE', '50'))
+# Pushed emails nobody was waiting for are held this long for the next wait;
+# delivered email IDs are remembered as long, so each is delivered once
+HOLD_TTL = float(os.environ.get('WAIT_EMAIL_HOLD_TTL', '600'))
+
+
+def timeout_result(timeout):
+    return {
+        'timeout': True,
+        'timeoutDuration': timeout,
+        'message': f'No email received within {timeout} seconds',
+    }
+
+
+def _settle(futures, result):
+    """Set `result` on each future not withdrawn meanwhile; returns how many took it."""
+    settled = 0
+    for future in futures:
+        try:
+            future.set_result(result)
+            settled += 1
+        except InvalidStateError:
+            pass  # cancelled by unwatch()
+    return settled
+
+
+def fetch_unread_emails(api_key, inbox_ids):
+    """One upstream sweep over many inboxes; yields (inbox_id, email dict) as each is fetched."""
+    emails_api = mailslurp_client.EmailControllerApi(get_api_client(api_key))
+    page = emails_api.get_emails_paginated(
+        inbox_id=list(inbox_ids), unread_only=True, sort='DESC', size=100)
+    latest = {}
+    for preview in page.content or []:
+        latest.setdefault(preview.inbox_id, preview.id)
+    for inbox_id, email_id in latest.items():
+        # Fetching the full email marks it read, so the next wait sees the next one
+        email = email_to_dict(emails_api.get_email(email_id))
+        email_cache.put(api_key, email)
+        yield inbox_id, email
+
+
+class _Watch:
+    """All waiters on one inbox; they share every upstream check."""
+    __slots__ = ('waiters',)
+
+    def __init__(self):
+        self.waiters = []  # (deadline, timeout, future)
+
+
+class InboxWatcher:
+    """Multiplexes wait_email requests onto one poll loop per API key.
+
+    Every `poll_interval` seconds, each API key with pending inboxes gets a
+    single sweep that checks them in batches of `batch_size`, and each result
+    is fanned out to every waiter on that inbox. Upstream call volume grows
+    with keys rather than with waiters.
+
+    Held results and delivered email IDs live in the state backend. When it
+    is shared, results another worker received (e.g. a webhook landing
+    there) are picked up for local waiters every `shared_poll_interval`.
+
+    `_cond` only guards the in-memory watches: futures are resolved after it
+    is released, since their callbacks may do backend I/O too. `_hold_lock`
+    orders holding a result against watch() taking it, so a waiter that
+    arrives in between still finds the result.
+    """
+
+    def __init__(self, fetch_batch=fetch_unread_emails, poll_interval=POLL_INTERVAL,
+                 workers=SWEEP_WORKERS, batch_size=BATCH_SIZE, hold_ttl=HOLD_TTL,
+                 state=state, shared_poll_interval=SHARED_POLL_INTERVAL):
+        self.fetch_batch = fetch_batch
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.hold_ttl = hold_ttl
+        self.state = state
+        self.shared_poll_interval = shared_poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='inbox-sweep')
+        self._watches = {}  # api_key -> {inbox_id: _Watch}
+        self._sweeping = set()  # api keys with a sweep in flight
+        self._due = {}  # api_key -> monotonic time of its next sweep
+        self._next_claim = 0.0
+        self._claiming = False
+        self._cond = threading.Condition()
+        self._hold_lock = threading.Lock()
+        self._thread = None
+        self.sweeps = 0
+        self.upstream_calls = 0
+        self.shared_claims = 0
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='inbox-watcher', daemon=True)
+            self._thread.start()
+
+    def watch(self, api_key, inbox_id, timeout):
+        """Return a Future resolved with the next email for `inbox_id` or a timeout result."""
+        future = Future()
+        with self._hold_lock:
+            held = self.state.take_held(key_digest(api_key), inbox_id)
+            if held is None:
+                with self._cond:
+                    inboxes = self._watches.setdefault(api_key, {})
+                    watch = inboxes.get(inbox_id)
+                    if watch is None:
+                        watch = inboxes[inbox_id] = _Watch()
+                    watch.waiters.append((time.monotonic() + timeout, timeout, future))
+                    self._ensure_started()
+                    self._cond.notify()
+        if held is not None:
+            future.set_result(held)
+        return future
+
+    def unwatch(self, api_key, inbox_id, future):
+        """Withdraw a pending watch() future; an inbox left without waiters stops being polled."""
+        with self._cond:
+            inboxes = self._watches.get(api_key, {})
+            watch = inboxes.get(inbox_id)
+            if watch is not None:
+                watch.waiters = [waiter for waiter in watch.waiters if waiter[2] is not future]
+                if not watch.waiters:
+                    del inboxes[inbox_id]
+                    if not inboxes:
+                        del self._watches[api_key]
+        return future.cancel()
+
+    def hold(self, api_key, inbox_id, result):
+        """Keep `result` for the next watch() on `inbox_id`."""
+        self.state.hold(key_digest(api_key), inbox_id, result, self.hold_ttl)
+
+    def deliver(self, api_key, inbox_id, result, hold=False):
+        """Resolve every waiter on `inbox_id` (under `api_key`, or any key if None).
+
+        With `hold`, a result nobody was waiting for is kept for the next
+        watch() on that inbox instead of being dropped; pushed emails have
+        already been marked read upstream, so polling would never see them.
+        An email already delivered once (by any worker sharing the state
+        backend) is ignored.
+        """
+        email_id = result.get('id') if result.get('success') else None
+        if email_id is not None:
+            if not self.state.claim(f'email:{email_id}', self.hold_ttl):
+                return 0
+            self.state.incr('emailsReceived')
+        return self._hand_over(api_key, inbox_id, result, hold and api_key is not None)
+
+    def _hand_over(self, api_key, inbox_id, result, hold):
+        with self._hold_lock:
+            with self._cond:
+                futures = self._resolve(api_key, inbox_id)
+            if hold and not futures:
+                self.hold(api_key, inbox_id, result)
+        delivered = _settle(futures, result)
+        if hold and futures and not delivered:
+            # Every waiter was withdrawn while this landed
+            self.hold(api_key, inbox_id, result)
+        return delivered
+
+    def _resolve(self, api_key, inbox_id):
+        # Caller holds the lock; removes and returns the waiting futures
+        keys = [api_key] if api_key is not None else list(self._watches)
+        futures = []
+        for key in keys:
+            watch = self._watches.get(key, {}).pop(inbox_id, None)
+            if watch is None:
+                continue
+            futures.extend(future for _, _, future in watch.waiters if not future.done())
+            if not self._watches[key]:
+                del self._watches[key]
+        return futures
+
+    def _claim_shared(self, watched):
+        """Hand results held in the shared backend to the local waiters they belong to."""
+        try:
+            owners = {key_digest(api_key): api_key for api_key, _ in watched}
+            pairs = [(key_digest(api_key), inbox_id) for api_key, inbox_id in watched]
+            for owner, inbox_id, result in self.state.take_held_many(pairs):
+                with self._cond:
+                    self.shared_claims += 1
+                # If its waiters timed out meanwhile, keep it for the next one
+                self._hand_over(owners[owner], inbox_id, result, hold=True)
+        except Exception as e:
+            logger.error(f"Error claiming shared results: {e}")
+        finally:
+            with self._cond:
+                self._claiming = False
+                self._cond.notify()
+
+    def _run(self):
+        expired = []
+        while True:
+            for future, timeout in expired:
+                _settle([future], timeout_result(timeout))
+            with self._cond:
+                while not self._watches:
+                    self._cond.wait()
+                now = time.monotonic()
+                # Wake for the next deadline too, so timeouts do not wait on polling
+                earliest, expired = self._expire(now)
+                wait = min(self.poll_interval, earliest - now)
+                for key in list(self._watches):
+                    if key in self._sweeping:
+                        continue
+                    due = self._due.get(key, now)
+                    if due > now:
+                        wait = min(wait, due - now)
+                        continue
+                    # New keys sweep at once; after that each key sweeps at most
+                    # once per poll_interval however many waiters arrive.
+                    self._due[key] = now + self.poll_interval
+                    self._sweeping.add(key)
+                    self._executor.submit(self._sweep, key, list(self._watches[key]))
+                if self.state.shared and self._watches and not self._claiming:
+                    if now >= self._next_claim:
+                        self._next_claim = now + self.shared_poll_interval
+                        self._claiming = True
+                        watched = [(key, inbox_id) for key, inboxes in self._watches.items()
+                                   for inbox_id in inboxes]
+                        self._executor.submit(self._claim_shared, watched)
+                    wait = min(wait, self._next_claim - now)
+                for key in [k for k, due in self._due.items() if k not in self._watches and due <= now]:
+                    del self._due[key]
+                if not expired:
+                    self._cond.wait(wait)
+
+    def _expire(self, now):
+        # Caller holds the lock; removes waiters past their deadline and returns
+        # them as (future, timeout) along with the earliest deadline still pending
+        earliest = float('inf')
+        expired = []
+        for key in list(self._watches):
+            inboxes = self._watches[key]
+            for inbox_id in list(inboxes):
+                watch = inboxes[inbox_id]
+                live = []
+                for deadline, timeout, future in watch.waiters:
+                    if future.done():
+                        continue
+                    if now >= deadline:
+                        expired.append((future, timeout))
+                    else:
+                        live.append((deadline, timeout, future))
+                        earliest = min(earliest, deadline)
+                if live:
+                    watch.waiters = live
+                else:
+                    del inboxes[inbox_id]
+            if not inboxes:
+                del self._watches[key]
+        return earliest, expired
+
+    def _sweep(self, api_key, inbox_ids):
+        try:
+            for start in range(0, len(inbox_ids), self.batch_size):
+                batch = inbox_ids[start:start + self.batch_size]
+                pending = set(batch)
+                with self._cond:
+                    self.upstream_calls += 1
+                try:
+                    # Deliver each result as soon as it is fetched. Fetching marked
+                    # it read, so if its waiters left meanwhile hold it for the next.
+                    for inbox_id, result in self.fetch_batch(api_key, batch):
+                        pending.discard(inbox_id)
+                        self.deliver(api_key, inbox_id, result, hold=result.get('success', False))
+                except ApiException as e:
+                    logger.error(f"MailSlurp API error while sweeping {len(batch)} inboxes: {e}")
+                    error = {'error': f'MailSlurp API error: {e.reason}'}
+                    for inbox_id in pending:
+                        self.deliver(api_key, inbox_id, error)
+                except Exception as e:
+                    logger.error(f"Unexpected error while sweeping {len(batch)} inboxes: {e}")
+                    for inbox_id in pending:
+                        self.deliver(api_key, inbox_id, {'error': str(e)})
+        finally:
+            with self._cond:
+                self.sweeps += 1
+                self._sweeping.discard(api_key)
+                # Let the loop start the next sweep as soon as it is due
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'keys': len(self._watches),
+                'inboxes': sum(len(inboxes) for inboxes in self._watches.values()),
+                'waiters': sum(len(w.waiters) for inboxes in self._watches.values()
+                               for w in inboxes.values()),
+                'sweeps': self.sweeps,
+                'upstreamCalls': self.upstream_calls,
+                'sharedClaims': self.shared_claims,
+            }
+
+
+inbox_watcher = InboxWatcher()
+registry.register_stats('emailgen_inbox_watcher', inbox_watcher.stats)
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import logging
+import threading
+import importlib
+import importlib.util
+
+from metrics import timed_phase
+
+logger = logging.getLogger(__name__)
+
+# Import the MailSlurp client while the app loads instead of on first use.
+# With gunicorn --preload that happens once in the master, before fork.
+PREWARM = os.environ.get('MAILSLURP_PREWARM', 'false').lower() == 'true'
+
+
+def _load_exceptions():
+    """Load mailslurp_client.exceptions on its own, without the package __init__.
+
+    The module only needs six, so except clauses get the real ApiException
+    class for free. It is registered under its package name, so when the full
+    package loads later it reuses this module and raises the same class.
+    """
+    name = 'mailslurp_client.exceptions'
+    module = sys.modules.get(name)
+    if module is None:
+        package = importlib.util.find_spec('mailslurp_client')
+        path = os.path.join(package.submodule_search_locations[0], 'exceptions.py')
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    The generated MailSlurp client imports every controller and model (and
+    urllib3, certifi, multiprocessing) from its package __init__, so loading
+    it costs far more than the rest of the app. Routes that never call
+    upstream, such as the index page and OTP extraction, never pay for it.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    with timed_phase('client_import'):
+                        module = importlib.import_module(self._name)
+                    exceptions = sys.modules.get(f'{self._name}.exceptions')
+                    if exceptions is not None and not hasattr(module, 'exceptions'):
+                        module.exceptions = exceptions
+                    logger.info(f"Imported {self._name} in {(time.perf_counter() - started) * 1000:.0f} ms")
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+mailslurp_client = LazyModule('mailslurp_client')
+ApiException = _load_exceptions().ApiException
+
+
+def prewarm():
+    """Import the MailSlurp client now, e.g. in a pre-fork master."""
+    return mailslurp_client.load()
@@ -0,0 +1,302 @@
+import os
+import re
+import sys
+import time
+import uuid
+import bisect
+import logging
+import threading
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+from flask import Blueprint, Response, g, request
+
+logger = logging.getLogger(__name__)
+
+# Opt-in sampling profiler: requests slower than this many ms get a folded-stack dump
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_REQUESTS_MS', '0'))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.01'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_str(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f'{self.name}{_label_str(self.labels, k)} {v}' for k, v in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def render(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = self.header()
+        names = self.labels + ('le',)
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_label_str(names, label_values + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_label_str(names, label_values + ("+Inf",))} {series[-1]}')
+            lines.append(f'{self.name}_sum{_label_str(self.labels, label_values)} {series[-2]}')
+            lines.append(f'{self.name}_count{_label_str(self.labels, label_values)} {series[-1]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._stats = []  # (prefix, callable returning a dict of numbers)
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix, stats):
+        """Expose every numeric value of `stats()` as gauge `<prefix>_<snake_case key>`."""
+        with self._lock:
+            self._stats.append((prefix, stats))
+
+    def render(self):
+        with self._lock:
+            metrics, stats = list(self._metrics), list(self._stats)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for prefix, collect in stats:
+            try:
+                values = collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector {prefix} failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{re.sub(r'(?<!^)(?=[A-Z])', '_', key).lower()}"
+                lines += [f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_requests = registry.register(Histogram(
+    'emailgen_http_request_duration_seconds', 'Time spent handling HTTP requests',
+    ('method', 'endpoint', 'status')))
+http_in_flight = registry.register(Gauge(
+    'emailgen_http_requests_in_flight', 'HTTP requests currently being handled'))
+upstream_requests = registry.register(Histogram(
+    'emailgen_upstream_request_duration_seconds', 'Time spent in MailSlurp API calls',
+    ('method', 'path')))
+upstream_errors = registry.register(Counter(
+    'emailgen_upstream_errors_total', 'MailSlurp API calls that failed, by status code',
+    ('method', 'path', 'status')))
+phases = registry.register(Histogram(
+    'emailgen_phase_duration_seconds', 'Time spent in named phases of request handling',
+    ('phase',)))
+
+
+def timed_phase(phase):
+    return phases.time(phase)
+
+
+def instrument_api_client(api_client):
+    """Time every MailSlurp call made through `api_client`, labelled by path template."""
+    call_api = api_client.call_api
+
+    def timed_call_api(resource_path, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return call_api(resource_path, method, *args, **kwargs)
+        except Exception as e:
+            upstream_errors.inc(method, resource_path, getattr(e, 'status', None) or 'error')
+            raise
+        finally:
+            upstream_requests.observe(time.perf_counter() - started, method, resource_path)
+
+    api_client.call_api = timed_call_api
+    return api_client
+
+
+class SamplingProfiler:
+    """Samples the stacks of in-flight request threads on a timer.
+
+    Only threads registered by an active request are sampled, and only while
+    at least one is active. A slow request's samples are written as folded
+    stacks that flamegraph.pl or speedscope can render.
+    """
+
+    def __init__(self, slow_ms=PROFILE_SLOW_MS, interval=PROFILE_INTERVAL, out_dir=PROFILE_DIR):
+        self.slow_ms = slow_ms
+        self.interval = interval
+        self.out_dir = out_dir
+        self._active = {}  # thread ident -> Counter of folded stacks
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.slow_ms > 0
+
+    def start(self):
+        ident = threading.get_ident()
+        with self._cond:
+            self._active[ident] = _Tally()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def stop(self, elapsed_ms, label):
+        with self._cond:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples and elapsed_ms >= self.slow_ms:
+            self._dump(samples, elapsed_ms, label)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._active:
+                    self._cond.wait()
+                idents = list(self._active)
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                # Raw (code, line) pairs keep sampling cheap; names are only
+                # formatted for the requests that turn out to be slow.
+                stack = []
+                while frame is not None:
+                    stack.append((frame.f_code, frame.f_lineno))
+                    frame = frame.f_back
+                with self._cond:
+                    samples = self._active.get(ident)
+                    if samples is not None:
+                        samples[tuple(stack)] += 1
+            time.sleep(self.interval)
+
+    def _dump(self, samples, elapsed_ms, label):
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            safe = re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_') or 'request'
+            path = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe}-{int(elapsed_ms)}ms-{uuid.uuid4().hex[:8]}.folded")
+            with open(path, 'w') as out:
+                for stack, count in samples.most_common():
+                    folded = ';'.join(f'{code.co_name} ({os.path.basename(code.co_filename)}:{line})'
+                                      for code, line in reversed(stack))
+                    out.write(f'{folded} {count}\n')
+            logger.info(f"Slow request {label} took {elapsed_ms:.0f} ms; profile written to {path}")
+        except OSError as e:
+            logger.warning(f"Could not write profile for {label}: {e}")
+
+
+profiler = SamplingProfiler()
+
+
+def init_app(app):
+    """Install request timing, in-flight tracking and the optional profiler."""
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        http_in_flight.inc()
+        if profiler.enabled:
+            profiler.start()
+
+    @app.teardown_request
+    def _stop_timer(exc):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        http_in_flight.dec()
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = getattr(g, '_metrics_status', 500 if exc else 200)
+        http_requests.observe(elapsed, request.method, endpoint, status)
+        if profiler.enabled:
+            profiler.stop(elapsed * 1000, f'{request.method} {endpoint}')
+
+    @app.after_request
+    def _record_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
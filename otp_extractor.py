@@ -0,0 +1,193 @@
+import re
+import html
+import logging
+import threading
+
+from flask import Blueprint, request, jsonify
+
+from metrics import timed_phase
+
+logger = logging.getLogger(__name__)
+
+HIGH = 0.9
+MEDIUM = 0.6
+LOW = 0.3
+
+BATCH_MAX_ITEMS = 1000
+# Above this many characters, keyword patterns only scan windows around anchors
+WINDOW_MIN_CHARS = 20_000
+
+# Whole words only ("barcode" is not a code), and not the codes of an address
+_KEYWORDS = (r'\b(?<!zip )(?<!postal )(?<!post )(?<!area )(?<!country )'
+             r'(?:code|otp|passcode|pin|one[- ]time password|verification|security code)')
+# Digits that are not part of a longer number, date, time or amount
+_DIGITS = r'(?<![\d.,/:-])\b(\d{4,8})\b(?![.,/:-]?\d)'
+
+# Ordered most to least specific; extraction stops at the first HIGH match
+DEFAULT_PATTERNS = [
+    ('keyword_digits', HIGH, re.compile(_KEYWORDS + r'\b[^0-9]{0,30}?' + _DIGITS, re.IGNORECASE)),
+    ('digits_is_your', HIGH, re.compile(_DIGITS + r'\s+is\s+your\b', re.IGNORECASE)),
+    ('keyword_alnum', MEDIUM, re.compile(
+        '(?i:' + _KEYWORDS + r')\b[^A-Za-z0-9]{0,10}(?:is\s*:?\s*)?\b((?=[A-Z]*\d)[A-Z0-9]{6,8})\b')),
+    ('six_digits', LOW, re.compile(r'(?<![\d.,/:-])\b(\d{6})\b(?![.,/:-]?\d)')),
+    ('digits', LOW, re.compile(_DIGITS)),
+]
+
+# Patterns whose matches always sit next to one of _ANCHORS, and the lowercase
+# anchors used to find candidate windows in long bodies
+_ANCHORED = {'keyword_digits', 'digits_is_your', 'keyword_alnum'}
+_ANCHORS = ('code', 'otp', 'passcode', 'pin', 'password', 'verification', 'is your')
+
+_SCRIPT_STYLE = re.compile(r'<(script|style)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r'<[^>]*>')
+_WHITESPACE = re.compile(r'\s\s+')
+
+
+def html_to_text(content):
+    """Cheap tag strip; good enough for code extraction, not for display."""
+    if '<' in content:
+        content = _SCRIPT_STYLE.sub(' ', content)
+        content = _TAG.sub(' ', content)
+    if '&' in content:
+        content = html.unescape(content)
+    return _WHITESPACE.sub(' ', content)
+
+
+def keyword_windows(text, before=40, after=160):
+    """Slices of `text` around OTP keywords, merged; None if they cover most of it."""
+    lower = text.lower()
+    spans = []
+    for anchor in _ANCHORS:
+        pos = lower.find(anchor)
+        while pos != -1:
+            spans.append((max(0, pos - before), pos + len(anchor) + after))
+            pos = lower.find(anchor, pos + 1)
+    spans.sort()
+    merged = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    if sum(end - start for start, end in merged) > len(text) // 2:
+        return None
+    return [text[start:end] for start, end in merged]
+
+
+class OtpExtractor:
+    """Runs precompiled OTP patterns over an email body.
+
+    Sender rules registered with add_sender_rule() run before the default
+    set for matching senders, so known formats short-circuit the generic
+    heuristics.
+    """
+
+    def __init__(self, patterns=DEFAULT_PATTERNS):
+        self.patterns = list(patterns)
+        self._sender_rules = []  # (compiled sender regex, [(name, confidence, regex)])
+        self._lock = threading.Lock()
+
+    def add_sender_rule(self, sender_pattern, code_pattern, name=None, confidence=HIGH):
+        """Prefer `code_pattern` (first group is the code) for senders matching `sender_pattern`."""
+        sender_re = re.compile(sender_pattern, re.IGNORECASE)
+        code_re = re.compile(code_pattern)
+        if code_re.groups < 1:
+            raise ValueError('code_pattern must contain a capture group for the code')
+        rule = (name or f'sender:{sender_pattern}', confidence, code_re)
+        with self._lock:
+            for existing, rules in self._sender_rules:
+                if existing.pattern == sender_re.pattern:
+                    rules.append(rule)
+                    return
+            self._sender_rules.append((sender_re, [rule]))
+
+    def _patterns_for(self, sender):
+        if not sender or not self._sender_rules:
+            return self.patterns
+        matched = []
+        for sender_re, rules in self._sender_rules:
+            if sender_re.search(sender):
+                matched.extend(rules)
+        return matched + self.patterns if matched else self.patterns
+
+    def extract(self, content, sender=None):
+        """Return {'otp', 'confidence', 'pattern'}; otp is None when nothing matched."""
+        if not content:
+            return {'otp': None, 'confidence': 0.0, 'pattern': None}
+        text = html_to_text(content)
+        windows = keyword_windows(text) if len(text) > WINDOW_MIN_CHARS else None
+        best = None
+        for name, confidence, regex in self._patterns_for(sender):
+            if best is not None and confidence <= best[1]:
+                continue
+            if windows is not None and name in _ANCHORED:
+                match = next(filter(None, map(regex.search, windows)), None)
+            else:
+                match = regex.search(text)
+            if match:
+                best = (match.group(1), confidence, name)
+                if confidence >= HIGH:
+                    break
+        if best is None:
+            return {'otp': None, 'confidence': 0.0, 'pattern': None}
+        return {'otp': best[0], 'confidence': best[1], 'pattern': best[2]}
+
+    def extract_many(self, items):
+        """`items` are strings or {'content', 'from'} dicts; results keep input order."""
+        results = []
+        for item in items:
+            if isinstance(item, dict):
+                results.append(self.extract(item.get('content') or '', item.get('from')))
+            else:
+                results.append(self.extract(item or ''))
+        return results
+
+
+otp_extractor = OtpExtractor()
+
+
+def extract_otp(content, sender=None):
+    return otp_extractor.extract(content, sender)
+
+
+def _valid_item(item):
+    """A string, or a dict whose 'content' and 'from' are strings when present."""
+    if item is None or isinstance(item, str):
+        return True
+    return (isinstance(item, dict)
+            and all(isinstance(item.get(field), (str, type(None))) for field in ('content', 'from')))
+
+
+otp_bp = Blueprint('otp', __name__)
+
+
+@otp_bp.route('/api/extract_otp', methods=['POST'])
+def extract_otp_single():
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict) or not _valid_item(data):
+        return jsonify({'error': 'content and from must be strings'}), 400
+    if not data.get('content'):
+        return jsonify({'error': 'Email content is required'}), 400
+
+    with timed_phase('otp_extract'):
+        result = extract_otp(data['content'], data.get('from'))
+    return jsonify(result)
+
+
+@otp_bp.route('/api/extract_otp/batch', methods=['POST'])
+def extract_otp_batch():
+    data = request.get_json(silent=True) or {}
+    items = data.get('emails', data.get('contents'))
+    if not isinstance(items, list):
+        return jsonify({'error': 'emails (or contents) must be a list'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {BATCH_MAX_ITEMS} emails per batch'}), 400
+    invalid = next((i for i, item in enumerate(items) if not _valid_item(item)), None)
+    if invalid is not None:
+        return jsonify({'error': f'emails[{invalid}] must be a string or an object with string '
+                                 f'content and from'}), 400
+
+    with timed_phase('otp_extract'):
+        results = otp_extractor.extract_many(items)
+    found = sum(1 for result in results if result['otp'])
+    return jsonify({'results': results, 'count': len(results), 'found': found})
@@ -0,0 +1,66 @@
+import os
+import bisect
+import hashlib
+import logging
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+# Base URLs of every node (or worker with its own port), listed in the same
+# order everywhere; unset leaves all work on whichever node receives it
+NODES = [node.strip().rstrip('/') for node in os.environ.get('CLUSTER_NODES', '').split(',') if node.strip()]
+# This node's own entry in CLUSTER_NODES
+NODE_URL = os.environ.get('NODE_URL', '').rstrip('/')
+VNODES = int(os.environ.get('CLUSTER_VNODES', '160'))
+FORWARD_TIMEOUT = float(os.environ.get('CLUSTER_FORWARD_TIMEOUT', '5'))
+# Set on forwarded requests so a node never forwards them again
+FORWARDED_HEADER = 'X-EmailGen-Forwarded'
+
+
+def _point(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hashing of inbox IDs onto nodes.
+
+    Each node owns `vnodes` points on the ring and a key belongs to the
+    first point at or after its hash, so adding or removing a node only
+    moves the keys next to that node's points. A load balancer (or client)
+    that routes an inbox's waits with the same ring keeps all of an inbox's
+    work, and its pushed emails, on one node.
+    """
+
+    def __init__(self, nodes=(), vnodes=VNODES):
+        self.nodes = list(nodes)
+        points = sorted((_point(f'{node}#{i}'), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key):
+        """The node owning `key`, or None for an empty ring."""
+        if not self._owners:
+            return None
+        return self._owners[bisect.bisect(self._hashes, _point(key)) % len(self._owners)]
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+ring = HashRing(NODES)
+
+
+def remote_owner(inbox_id):
+    """Base URL of the node owning `inbox_id`, or None if that is this node or routing is off."""
+    if not NODE_URL:
+        return None
+    node = ring.node_for(inbox_id)
+    return node if node and node != NODE_URL else None
+
+
+def forward(node, path, body):
+    """POST a JSON `body` to `path` on `node`; returns the response status."""
+    request = urllib.request.Request(node + path, data=body, method='POST', headers={
+        'Content-Type': 'application/json', FORWARDED_HEADER: '1'})
+    with urllib.request.urlopen(request, timeout=FORWARD_TIMEOUT) as response:
+        return response.status
@@ -0,0 +1,40 @@
+"""Serve EmailGen from one gevent process.
+
+    python serve_evented.py --host 0.0.0.0 --port 5000
+
+Requests, open event streams (GET /api/inboxes/<id>/events) and the
+background pollers all run as greenlets rather than OS threads, so an idle
+subscription costs a socket and a little memory and one process holds
+thousands of them. `gunicorn -k gevent EmailGen:app` is the equivalent under
+gunicorn; with more than one process set STATE_BACKEND=sqlite so
+subscription tokens and wait tickets work on every worker.
+"""
+from gevent import monkey
+
+# Before anything imports socket, ssl or threading
+monkey.patch_all()
+
+import os  # noqa: E402
+import logging  # noqa: E402
+import argparse  # noqa: E402
+
+from gevent.pywsgi import WSGIServer  # noqa: E402
+
+from EmailGen import app  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '5000')))
+    args = parser.parse_args()
+
+    server = WSGIServer((args.host, args.port), app, log=None, error_log=logger)
+    logger.info(f"Serving EmailGen on http://{args.host}:{args.port} (gevent)")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import Blueprint, jsonify
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# 'memory' keeps state per process; 'sqlite' shares it between every worker
+# process that opens STATE_DB_PATH
+BACKEND = os.environ.get('STATE_BACKEND', 'memory').lower()
+DB_PATH = os.environ.get('STATE_DB_PATH', 'emailgen-state.db')
+# How often a worker looks for results other workers received for its waits
+POLL_INTERVAL = float(os.environ.get('STATE_POLL_INTERVAL', '0.25'))
+HOLD_MAX_INBOXES = int(os.environ.get('WAIT_EMAIL_HOLD_MAX_INBOXES', '10000'))
+MAX_CLAIMS = 100000
+# Webhook owners are forgotten after a week without a new inbox registration
+OWNER_TTL = 7 * 24 * 3600
+# Upserts need SQLite 3.24; DELETE ... RETURNING (3.35) is used when present
+SQLITE_MIN_VERSION = (3, 24, 0)
+SQLITE_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+class MemoryBackend:
+    """Process-local state: the default, and all a single worker needs.
+
+    Covers what every backend provides: aggregate counters, one-shot claims
+    (so an email reaching us twice is handled once), results held for the
+    next wait on an inbox and short-lived event-stream tokens. Tickets and
+    webhook owners already live in the WaitEngine and InboxIndex of the
+    process, so callers only use the backend for those when it is `shared`.
+    """
+    name = 'memory'
+    shared = False
+
+    def __init__(self, max_held_inboxes=HOLD_MAX_INBOXES, max_claims=MAX_CLAIMS):
+        self.max_held_inboxes = max_held_inboxes
+        self.max_claims = max_claims
+        self._counters = {}
+        self._claims = OrderedDict()  # key -> monotonic expiry
+        self._held = OrderedDict()  # (owner, inbox_id) -> [(expires, result)] oldest first
+        self._tokens = OrderedDict()  # digest -> (monotonic expiry, value)
+        self._lock = threading.Lock()
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def claim(self, key, ttl):
+        """True for the first caller to claim `key` within `ttl` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            expires = self._claims.get(key)
+            if expires is not None and expires > now:
+                return False
+            self._claims[key] = now + ttl
+            self._claims.move_to_end(key)
+            while self._claims:
+                oldest, expires = next(iter(self._claims.items()))
+                if expires > now and len(self._claims) <= self.max_claims:
+                    break
+                del self._claims[oldest]
+            return True
+
+    def hold(self, owner, inbox_id, result, ttl):
+        now = time.monotonic()
+        with self._lock:
+            while self._held:
+                key, results = next(iter(self._held.items()))
+                if results[-1][0] > now and len(self._held) < self.max_held_inboxes:
+                    break
+                del self._held[key]
+            self._held.setdefault((owner, inbox_id), []).append((now + ttl, result))
+            self._held.move_to_end((owner, inbox_id))
+
+    def take_held(self, owner, inbox_id):
+        """Pop the oldest live result held for `inbox_id`, or None."""
+        now = time.monotonic()
+        with self._lock:
+            results = self._held.get((owner, inbox_id))
+            while results:
+                expires, result = results.pop(0)
+                if not results:
+                    del self._held[(owner, inbox_id)]
+                if expires > now:
+                    return result
+        return None
+
+    def put_token(self, digest, value, ttl):
+        now = time.monotonic()
+        with self._lock:
+            while self._tokens and next(iter(self._tokens.values()))[0] <= now:
+                self._tokens.popitem(last=False)
+            self._tokens[digest] = (now + ttl, value)
+
+    def get_token(self, digest):
+        with self._lock:
+            entry = self._tokens.get(digest)
+        return entry[1] if entry is not None and entry[0] > time.monotonic() else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.name,
+                'held': sum(len(results) for results in self._held.values()),
+                'claims': len(self._claims),
+            }
+
+
+class SqliteBackend:
+    """State shared by every process that opens the same SQLite database.
+
+    WAL mode lets readers run alongside the one writer and every operation
+    is a single statement, so workers never hold each other up for long.
+    On top of the MemoryBackend operations it keeps wait tickets (any
+    worker can answer a poll) and webhook inbox owners (any worker can act
+    on a push). Owners are stored as a key digest plus the key sealed by the
+    caller, never the raw key, and the file is still created private to its
+    user. WAL needs shared memory, so keep the file on local disk: every
+    process on one host shares it, not processes on different hosts.
+    """
+    name = 'sqlite'
+    shared = True
+    PRUNE_EVERY = 1000
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS held ('
+        ' id INTEGER PRIMARY KEY AUTOINCREMENT, owner TEXT NOT NULL, inbox_id TEXT NOT NULL,'
+        ' result TEXT NOT NULL, expires_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS held_inbox ON held (inbox_id)',
+        'CREATE TABLE IF NOT EXISTS tickets (ticket TEXT PRIMARY KEY, result TEXT, expires_at REAL NOT NULL)',
+        # Earlier versions kept raw API keys in `owners`
+        'DROP TABLE IF EXISTS owners',
+        'CREATE TABLE IF NOT EXISTS webhook_owners (inbox_id TEXT PRIMARY KEY, key_digest TEXT NOT NULL,'
+        ' sealed_key BLOB NOT NULL, updated_at REAL NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS stream_tokens (digest TEXT PRIMARY KEY, value BLOB NOT NULL,'
+        ' expires_at REAL NOT NULL)',
+    )
+
+    def __init__(self, path=DB_PATH):
+        if sqlite3.sqlite_version_info < SQLITE_MIN_VERSION:
+            raise RuntimeError(f"STATE_BACKEND=sqlite needs SQLite {'.'.join(map(str, SQLITE_MIN_VERSION))}+, "
+                               f"found {sqlite3.sqlite_version}")
+        self.path = path
+        self._conn = None
+        self._pid = None
+        self._writes = 0
+        self._lock = threading.Lock()
+        with self._lock:
+            conn = self._connection()
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self):
+        # Caller holds the lock. A connection must not cross fork(), so a
+        # pre-fork master and each of its workers open their own.
+        if self._conn is None or self._pid != os.getpid():
+            if not os.path.exists(self.path):
+                os.close(os.open(self.path, os.O_CREAT | os.O_WRONLY, 0o600))
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._pid = os.getpid()
+        return self._conn
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(sql, params)
+            rows = cursor.fetchall() if cursor.description else None
+            self._writes += 1
+            changed = cursor.rowcount
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(conn)
+        return changed, rows
+
+    @staticmethod
+    def _prune(conn):
+        now = time.time()
+        for table in ('claims', 'held', 'tickets', 'stream_tokens'):
+            conn.execute(f'DELETE FROM {table} WHERE expires_at <= ?', (now,))
+        conn.execute('DELETE FROM webhook_owners WHERE updated_at <= ?', (now - OWNER_TTL,))
+
+    def incr(self, name, amount=1):
+        self._write('INSERT INTO counters VALUES (?, ?) '
+                    'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value', (name, amount))
+
+    def counters(self):
+        return dict(self._read('SELECT name, value FROM counters'))
+
+    def claim(self, key, ttl):
+        now = time.time()
+        changed, _ = self._write('INSERT INTO claims VALUES (?, ?) ON CONFLICT (key) '
+                                 'DO UPDATE SET expires_at = excluded.expires_at WHERE expires_at <= ?',
+                                 (key, now + ttl, now))
+        return changed == 1
+
+    def hold(self, owner, inbox_id, result, ttl):
+        self._write('INSERT INTO held (owner, inbox_id, result, expires_at) VALUES (?, ?, ?, ?)',
+                    (owner, inbox_id, json.dumps(result), time.time() + ttl))
+
+    def _take(self, columns, ids, params):
+        """Delete the held rows whose id is in subquery `ids`, returning `columns` of each."""
+        # Every worker polls for held results several times a second and
+        # there usually are none; a read avoids taking the write lock for that
+        if not self._read(f'SELECT 1 FROM held WHERE id IN ({ids}) LIMIT 1', params):
+            return []
+        if SQLITE_RETURNING:
+            _, rows = self._write(f'DELETE FROM held WHERE id IN ({ids}) RETURNING {columns}', params)
+            return rows
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(f'SELECT id, {columns} FROM held WHERE id IN ({ids})', params).fetchall()
+                conn.executemany('DELETE FROM held WHERE id = ?', [(row[0],) for row in rows])
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            self._writes += 1
+        return [row[1:] for row in rows]
+
+    def take_held(self, owner, inbox_id):
+        rows = self._take('result', 'SELECT id FROM held WHERE owner = ? AND inbox_id = ?'
+                          ' AND expires_at > ? ORDER BY id LIMIT 1', (owner, inbox_id, time.time()))
+        return json.loads(rows[0][0]) if rows else None
+
+    def take_held_many(self, pairs, chunk=400):
+        """Pop the oldest live result for each (owner, inbox_id); yields (owner, inbox_id, result)."""
+        pairs = list(pairs)
+        for start in range(0, len(pairs), chunk):
+            batch = pairs[start:start + chunk]
+            values = ', '.join(['(?, ?)'] * len(batch))
+            params = [value for pair in batch for value in pair]
+            rows = self._take('owner, inbox_id, result', 'SELECT MIN(id) FROM held WHERE expires_at > ?'
+                              f' AND (owner, inbox_id) IN (VALUES {values}) GROUP BY owner, inbox_id',
+                              [time.time()] + params)
+            for owner, inbox_id, result in rows:
+                yield owner, inbox_id, json.loads(result)
+
+    def put_ticket(self, ticket, ttl):
+        self._write('INSERT OR REPLACE INTO tickets VALUES (?, NULL, ?)', (ticket, time.time() + ttl))
+
+    def finish_ticket(self, ticket, result, ttl):
+        self._write('UPDATE tickets SET result = ?, expires_at = ? WHERE ticket = ?',
+                    (json.dumps(result), time.time() + ttl, ticket))
+
+    def get_ticket(self, ticket):
+        """The ticket's result, {'pending': True} while it runs, or None if unknown."""
+        rows = self._read('SELECT result FROM tickets WHERE ticket = ? AND expires_at > ?',
+                          (ticket, time.time()))
+        if not rows:
+            return None
+        if rows[0][0] is None:
+            return {'pending': True, 'ticket': ticket}
+        return json.loads(rows[0][0])
+
+    def set_owner(self, inbox_id, key_digest, sealed_key):
+        self._write('INSERT OR REPLACE INTO webhook_owners VALUES (?, ?, ?, ?)',
+                    (inbox_id, key_digest, sealed_key, time.time()))
+
+    def owner(self, inbox_id):
+        """(key_digest, sealed_key) recorded for `inbox_id`, or None."""
+        rows = self._read('SELECT key_digest, sealed_key FROM webhook_owners WHERE inbox_id = ?'
+                          ' AND updated_at > ?', (inbox_id, time.time() - OWNER_TTL))
+        return (rows[0][0], bytes(rows[0][1])) if rows else None
+
+    def put_token(self, digest, value, ttl):
+        self._write('INSERT OR REPLACE INTO stream_tokens VALUES (?, ?, ?)', (digest, value, time.time() + ttl))
+
+    def get_token(self, digest):
+        rows = self._read('SELECT value FROM stream_tokens WHERE digest = ? AND expires_at > ?',
+                          (digest, time.time()))
+        return bytes(rows[0][0]) if rows else None
+
+    def stats(self):
+        now = time.time()
+        (held, pending), = self._read(
+            'SELECT (SELECT COUNT(*) FROM held WHERE expires_at > ?),'
+            ' (SELECT COUNT(*) FROM tickets WHERE result IS NULL AND expires_at > ?)', (now, now))
+        return {
+            'backend': self.name,
+            'held': held,
+            'pendingTickets': pending,
+            'writes': self._writes,
+        }
+
+
+def create_backend(name=BACKEND, path=DB_PATH):
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'sqlite':
+        return SqliteBackend(path)
+    raise ValueError(f"Unknown STATE_BACKEND {name!r}; expected 'memory' or 'sqlite'")
+
+
+state = create_backend()
+registry.register_stats('emailgen_state', state.stats)
+
+state_bp = Blueprint('state', __name__)
+
+
+@state_bp.route('/api/stats', methods=['GET'])
+def aggregate_stats():
+    # Totals across every worker sharing the backend (this process only with 'memory')
+    counters = state.counters()
+    return jsonify({
+        'inboxCount': counters.get('inboxesCreated', 0),
+        'emailCount': counters.get('emailsReceived', 0),
+        'counters': counters,
+        **state.stats(),
+    })
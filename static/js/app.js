@@ -0,0 +1,390 @@
+// Global state
+let currentInboxId = null;
+let currentApiKey = null;
+let stats = { inboxes: 0, emails: 0 };
+let currentEmailData = null;
+let emailStream = null;
+
+// DOM elements
+const elements = {
+    apiKey: document.getElementById('apiKey'),
+    createInboxBtn: document.getElementById('createInboxBtn'),
+    waitEmailBtn: document.getElementById('waitEmailBtn'),
+    inboxInfo: document.getElementById('inboxInfo'),
+    emailAddress: document.getElementById('emailAddress'),
+    inboxId: document.getElementById('inboxId'),
+    createdAt: document.getElementById('createdAt'),
+    waitingIndicator: document.getElementById('waitingIndicator'),
+    emailContent: document.getElementById('emailContent'),
+    emailDetails: document.getElementById('emailDetails'),
+    status: document.getElementById('status'),
+    copyEmail: document.getElementById('copyEmail'),
+    extractOtpBtn: document.getElementById('extractOtpBtn'),
+    otpResult: document.getElementById('otpResult'),
+    clearBtn: document.getElementById('clearBtn'),
+    exportBtn: document.getElementById('exportBtn'),
+    inboxCount: document.getElementById('inboxCount'),
+    emailCount: document.getElementById('emailCount')
+};
+
+// Utility functions
+function showToast(message, type = 'info') {
+    const toast = document.getElementById('toast');
+    const icon = document.getElementById('toastIcon');
+    const messageEl = document.getElementById('toastMessage');
+
+    const icons = {
+        success: 'fas fa-check-circle text-green-500',
+        error: 'fas fa-exclamation-circle text-red-500',
+        info: 'fas fa-info-circle text-blue-500',
+        warning: 'fas fa-exclamation-triangle text-yellow-500'
+    };
+
+    icon.className = icons[type];
+    messageEl.textContent = message;
+    toast.classList.remove('hidden');
+    toast.classList.add('fade-in');
+
+    setTimeout(() => {
+        toast.classList.add('hidden');
+        toast.classList.remove('fade-in');
+    }, 3000);
+}
+
+function updateStatus(status, type = 'info') {
+    const statusEl = elements.status;
+    const colors = {
+        success: 'bg-green-100 text-green-600',
+        error: 'bg-red-100 text-red-600',
+        info: 'bg-blue-100 text-blue-600',
+        warning: 'bg-yellow-100 text-yellow-600'
+    };
+
+    statusEl.className = `px-2 py-1 text-xs font-medium rounded-full ${colors[type]}`;
+    statusEl.textContent = status;
+}
+
+function updateStats() {
+    elements.inboxCount.textContent = stats.inboxes;
+    elements.emailCount.textContent = stats.emails;
+}
+
+function formatDate(dateString) {
+    if (!dateString) return 'N/A';
+    return new Date(dateString).toLocaleString();
+}
+
+function receiveEmail(email) {
+    // The push stream and "Wait for Email" can both deliver the same email
+    if (currentEmailData && currentEmailData.id === email.id) return;
+    currentEmailData = email;
+    displayEmail(email);
+
+    stats.emails++;
+    updateStats();
+    updateStatus('Email received', 'success');
+    showToast('Email received successfully!', 'success');
+}
+
+// API functions
+async function createInbox(apiKey) {
+    const response = await fetch('/api/create_inbox', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ apiKey })
+    });
+    return response.json();
+}
+
+async function waitEmail(apiKey, inboxId) {
+    // Submit a wait ticket and poll it, so no request holds a server worker for the whole wait
+    const response = await fetch('/api/wait_email/submit', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ apiKey, inboxId })
+    });
+    const submitted = await response.json();
+    if (!submitted.ticket) return submitted;
+
+    while (true) {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const poll = await fetch(`/api/wait_email/${encodeURIComponent(submitted.ticket)}`);
+        const result = await poll.json();
+        if (!result.pending) return result;
+    }
+}
+
+async function extractOtp(content, from) {
+    const response = await fetch('/api/extract_otp', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ content, from })
+    });
+    return response.json();
+}
+
+async function exportData(apiKey) {
+    const response = await fetch('/api/export', { headers: { 'X-API-Key': apiKey } });
+    if (!response.ok) {
+        const { error } = await response.json();
+        throw new Error(error || 'Export failed');
+    }
+    const text = await response.text();
+    const lines = text.trim().split('\n');
+    const last = JSON.parse(lines[lines.length - 1] || '{}');
+    // The status is sent before the first record, so failures arrive as a final 'error' record
+    if (last.type === 'error') throw new Error(last.error);
+    if (last.type !== 'end') throw new Error('Export ended early');
+    return text;
+}
+
+async function subscribeInbox(apiKey, inboxId, onEmail) {
+    // EventSource URLs end up in logs, so the stream gets a short-lived token, never the key
+    const path = `/api/inboxes/${encodeURIComponent(inboxId)}/events`;
+    const response = await fetch(`${path}/token`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ apiKey })
+    });
+    const { token, error } = await response.json();
+    if (!token) throw new Error(error || 'Could not subscribe to new emails');
+
+    const source = new EventSource(`${path}?token=${encodeURIComponent(token)}`);
+    source.addEventListener('email', (event) => onEmail(JSON.parse(event.data)));
+    source.addEventListener('inbox-error', (event) => {
+        updateStatus('Error checking inbox', 'error');
+        showToast(`Error: ${JSON.parse(event.data).error}`, 'error');
+    });
+    return source;
+}
+
+function startEmailStream(apiKey, inboxId) {
+    subscribeInbox(apiKey, inboxId, receiveEmail)
+        .then((source) => {
+            if (currentInboxId !== inboxId) {
+                source.close();
+                return;
+            }
+            emailStream = source;
+            source.addEventListener('error', () => {
+                // Reconnects reuse the token, so once it has expired the browser gives up
+                if (source.readyState !== EventSource.CLOSED || emailStream !== source) return;
+                emailStream = null;
+                setTimeout(() => {
+                    if (currentInboxId === inboxId && !emailStream) startEmailStream(apiKey, inboxId);
+                }, 3000);
+            });
+        })
+        .catch((error) => showToast(`Live updates unavailable: ${error.message}`, 'warning'));
+}
+
+// Event handlers
+elements.createInboxBtn.addEventListener('click', async () => {
+    const apiKey = elements.apiKey.value.trim();
+    if (!apiKey) {
+        showToast('Please enter your MailSlurp API key', 'error');
+        return;
+    }
+
+    currentApiKey = apiKey;
+    elements.createInboxBtn.disabled = true;
+    elements.createInboxBtn.innerHTML = '<i class="fas fa-spinner loading mr-2"></i>Creating...';
+    updateStatus('Creating inbox...', 'info');
+
+    try {
+        const result = await createInbox(apiKey);
+
+        if (result.error) {
+            throw new Error(result.error);
+        }
+
+        currentInboxId = result.id;
+        elements.emailAddress.textContent = result.emailAddress;
+        elements.inboxId.textContent = result.id;
+        elements.createdAt.textContent = formatDate(result.createdAt);
+
+        elements.inboxInfo.classList.remove('hidden');
+        elements.inboxInfo.classList.add('slide-in');
+        elements.waitEmailBtn.disabled = false;
+
+        stats.inboxes++;
+        updateStats();
+        updateStatus('Inbox created successfully', 'success');
+        showToast('Inbox created successfully!', 'success');
+
+        // Push new emails as they arrive instead of waiting on a button click
+        if (emailStream) emailStream.close();
+        emailStream = null;
+        startEmailStream(apiKey, result.id);
+
+    } catch (error) {
+        showToast(`Error: ${error.message}`, 'error');
+        updateStatus('Error creating inbox', 'error');
+    } finally {
+        elements.createInboxBtn.disabled = false;
+        elements.createInboxBtn.innerHTML = '<i class="fas fa-plus mr-2"></i>Create New Inbox';
+    }
+});
+
+elements.waitEmailBtn.addEventListener('click', async () => {
+    if (!currentApiKey || !currentInboxId) {
+        showToast('Please create an inbox first', 'error');
+        return;
+    }
+
+    elements.waitEmailBtn.disabled = true;
+    elements.waitEmailBtn.innerHTML = '<i class="fas fa-spinner loading mr-2"></i>Waiting...';
+    elements.waitingIndicator.classList.remove('hidden');
+    updateStatus('Waiting for email...', 'warning');
+
+    try {
+        const result = await waitEmail(currentApiKey, currentInboxId);
+
+        if (result.success) {
+            // Email received successfully
+            receiveEmail(result);
+        } else if (result.timeout) {
+            // Timeout - no email received
+            updateStatus('No email received', 'warning');
+            showToast(`No email received within ${result.timeoutDuration} seconds. Send an email to the inbox and try again.`, 'warning');
+
+            // Show helpful message in email content area
+            elements.emailContent.innerHTML = `
+                <div class="text-center py-12">
+                    <i class="fas fa-clock text-yellow-400 text-4xl mb-4"></i>
+                    <h3 class="text-lg font-semibold text-gray-700 mb-2">No Email Received</h3>
+                    <p class="text-gray-500 mb-4">No email was received within the 60-second timeout period.</p>
+                    <div class="bg-blue-50 border border-blue-200 rounded-lg p-4 max-w-md mx-auto">
+                        <h4 class="font-medium text-blue-800 mb-2">Next Steps:</h4>
+                        <ol class="text-sm text-blue-700 text-left space-y-1">
+                            <li>1. Send an email to: <strong class="font-mono">${elements.emailAddress.textContent}</strong></li>
+                            <li>2. Click "Wait for Email" again</li>
+                            <li>3. The system will wait up to 60 seconds for new emails</li>
+                        </ol>
+                    </div>
+                </div>
+            `;
+        } else {
+            // Other error
+            throw new Error(result.error || 'Unknown error occurred');
+        }
+
+    } catch (error) {
+        showToast(`Error: ${error.message}`, 'error');
+        updateStatus('Error waiting for email', 'error');
+    } finally {
+        elements.waitEmailBtn.disabled = false;
+        elements.waitEmailBtn.innerHTML = '<i class="fas fa-clock mr-2"></i>Wait for Email';
+        elements.waitingIndicator.classList.add('hidden');
+    }
+});
+
+function displayEmail(email) {
+    document.getElementById('emailFrom').textContent = email.from || 'Unknown';
+    document.getElementById('emailSubject').textContent = email.subject || '(no subject)';
+    document.getElementById('emailReceived').textContent = formatDate(email.createdAt);
+    document.getElementById('emailId').textContent = email.id;
+
+    // Email HTML is untrusted, so it renders in a sandboxed frame with scripts disabled
+    const frame = document.createElement('iframe');
+    frame.setAttribute('sandbox', '');
+    frame.className = 'w-full h-96 border rounded';
+    frame.srcdoc = email.body || '';
+    elements.emailContent.replaceChildren(frame);
+    elements.emailContent.classList.add('fade-in');
+
+    elements.emailDetails.classList.remove('hidden');
+    elements.otpResult.textContent = '';
+}
+
+elements.copyEmail.addEventListener('click', async () => {
+    try {
+        await navigator.clipboard.writeText(elements.emailAddress.textContent);
+        showToast('Email address copied to clipboard', 'success');
+    } catch (error) {
+        showToast('Could not copy email address', 'error');
+    }
+});
+
+elements.extractOtpBtn.addEventListener('click', async () => {
+    if (!currentEmailData) {
+        showToast('No email to extract an OTP from', 'error');
+        return;
+    }
+
+    elements.extractOtpBtn.disabled = true;
+    elements.otpResult.innerHTML = '<i class="fas fa-spinner loading"></i>';
+
+    try {
+        const result = await extractOtp(currentEmailData.body, currentEmailData.from);
+        if (result.error) {
+            throw new Error(result.error);
+        }
+
+        if (result.otp) {
+            elements.otpResult.className = 'ml-4 text-sm text-green-600';
+            elements.otpResult.innerHTML = `<i class="fas fa-key mr-1"></i>OTP: <span class="font-mono font-bold"></span>`;
+            elements.otpResult.querySelector('span').textContent = result.otp;
+            showToast(`OTP found: ${result.otp}`, 'success');
+        } else {
+            elements.otpResult.className = 'ml-4 text-sm text-gray-600';
+            elements.otpResult.textContent = 'No OTP found in this email';
+            showToast('No OTP found in this email', 'warning');
+        }
+    } catch (error) {
+        elements.otpResult.className = 'ml-4 text-sm text-red-600';
+        elements.otpResult.textContent = 'Extraction failed';
+        showToast(`Error: ${error.message}`, 'error');
+    } finally {
+        elements.extractOtpBtn.disabled = false;
+    }
+});
+
+elements.clearBtn.addEventListener('click', () => {
+    if (emailStream) emailStream.close();
+    emailStream = null;
+    currentInboxId = null;
+    currentEmailData = null;
+    stats = { inboxes: 0, emails: 0 };
+    updateStats();
+
+    elements.inboxInfo.classList.add('hidden');
+    elements.emailDetails.classList.add('hidden');
+    elements.waitEmailBtn.disabled = true;
+    elements.otpResult.textContent = '';
+    elements.emailContent.innerHTML = `
+        <div class="text-center py-12">
+            <i class="fas fa-envelope-open text-gray-300 text-4xl mb-4"></i>
+            <p class="text-gray-500">Create an inbox and wait for emails to display content here</p>
+        </div>
+    `;
+
+    updateStatus('Ready', 'info');
+    showToast('Cleared', 'info');
+});
+
+elements.exportBtn.addEventListener('click', async () => {
+    const apiKey = currentApiKey || elements.apiKey.value.trim();
+    if (!apiKey) {
+        showToast('Please enter your MailSlurp API key', 'error');
+        return;
+    }
+
+    elements.exportBtn.disabled = true;
+    elements.exportBtn.innerHTML = '<i class="fas fa-spinner loading mr-2"></i>Exporting...';
+
+    try {
+        const data = await exportData(apiKey);
+        const link = document.createElement('a');
+        link.href = URL.createObjectURL(new Blob([data], { type: 'application/x-ndjson' }));
+        link.download = `mailslurp-export-${new Date().toISOString().slice(0, 19).replace(/[:T]/g, '')}.ndjson`;
+        link.click();
+        URL.revokeObjectURL(link.href);
+        showToast('Export downloaded', 'success');
+    } catch (error) {
+        showToast(`Export failed: ${error.message}`, 'error');
+    } finally {
+        elements.exportBtn.disabled = false;
+        elements.exportBtn.innerHTML = '<i class="fas fa-download mr-2"></i>Export Data';
+    }
+});
@@ -0,0 +1,319 @@
+import os
+import time
+import random
+import logging
+import threading
+import weakref
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+
+from lazy_mailslurp import ApiException
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Set to false to send every MailSlurp call straight through, as before
+GATEWAY_ENABLED = os.environ.get('UPSTREAM_GATEWAY', 'true').lower() == 'true'
+# Upstream calls per second allowed per API key; 0 leaves pacing to the concurrency limit
+UPSTREAM_RATE = float(os.environ.get('UPSTREAM_RATE', '0'))
+UPSTREAM_BURST = float(os.environ.get('UPSTREAM_BURST', '0')) or None
+# AIMD concurrency limit per API key: starts here, grows by one per window of
+# successes and halves on 429/503. install_gateway() also caps it at the
+# client's connection pool size (MAILSLURP_POOL_MAXSIZE)
+UPSTREAM_CONCURRENCY = int(os.environ.get('UPSTREAM_CONCURRENCY', '8'))
+UPSTREAM_MIN_CONCURRENCY = int(os.environ.get('UPSTREAM_MIN_CONCURRENCY', '1'))
+UPSTREAM_MAX_CONCURRENCY = int(os.environ.get('UPSTREAM_MAX_CONCURRENCY', '64'))
+# Seconds a call may queue for a concurrency slot before failing
+UPSTREAM_QUEUE_TIMEOUT = float(os.environ.get('UPSTREAM_QUEUE_TIMEOUT', '30'))
+UPSTREAM_RETRIES = int(os.environ.get('UPSTREAM_RETRIES', '4'))
+UPSTREAM_BACKOFF_BASE = float(os.environ.get('UPSTREAM_BACKOFF_BASE', '0.2'))
+UPSTREAM_BACKOFF_MAX = float(os.environ.get('UPSTREAM_BACKOFF_MAX', '10'))
+# A Retry-After longer than this is returned to the caller instead of waited out
+UPSTREAM_RETRY_AFTER_MAX = float(os.environ.get('UPSTREAM_RETRY_AFTER_MAX', '30'))
+
+# A 429 means the request was not processed, so any method may be retried;
+# gateway errors are only retried where repeating the call is harmless.
+RETRY_ANY_METHOD = (429,)
+RETRY_IDEMPOTENT = (502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+OVERLOAD_STATUSES = (429, 503)
+# Positional parameters of ApiClient.call_api after resource_path and method
+CALL_API_PARAMS = ('path_params', 'query_params', 'header_params', 'body', 'post_params', 'files',
+                   'response_type', 'auth_settings', 'async_req', '_return_http_data_only',
+                   'collection_formats', '_preload_content', '_request_timeout', '_host')
+
+
+class RateLimiter:
+    """Per-key token bucket; acquire() blocks until a call is allowed."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._buckets = {}  # key -> (tokens, last refill)
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(key, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self._buckets[key] = (tokens - 1, now)
+                    return
+                self._buckets[key] = (tokens, now)
+                delay = (1 - tokens) / self.rate
+            time.sleep(delay)
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit.
+
+    Each success adds 1/limit, so the limit grows by about one per window of
+    calls; an overload response halves it, at most once per round trip so a
+    burst of 429s from one window only counts once.
+    """
+
+    def __init__(self, initial=UPSTREAM_CONCURRENCY, minimum=UPSTREAM_MIN_CONCURRENCY,
+                 maximum=UPSTREAM_MAX_CONCURRENCY):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.in_flight = 0
+        self.decreases = 0
+        self._latency = 0.0  # EWMA of call latency, seconds
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, overloaded):
+        with self._cond:
+            self.in_flight -= 1
+            self._latency = latency if not self._latency else 0.8 * self._latency + 0.2 * latency
+            now = time.monotonic()
+            if overloaded:
+                if now - self._last_decrease >= max(self._latency, 0.05):
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def retry_after_seconds(e):
+    """Seconds asked for by a Retry-After header (delta or HTTP date), or None."""
+    headers = getattr(e, 'headers', None)
+    value = headers.get('Retry-After') if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class UpstreamGateway:
+    """Front door for every MailSlurp call made with one API key.
+
+    Calls are paced by a token bucket, capped by an AIMD concurrency limit and
+    retried with full-jitter exponential backoff (or the upstream's
+    Retry-After, which also pauses the key's other calls). Identical GETs
+    already in flight share a single upstream request.
+    """
+
+    def __init__(self, rate=UPSTREAM_RATE, burst=UPSTREAM_BURST, concurrency=None,
+                 retries=UPSTREAM_RETRIES, backoff_base=UPSTREAM_BACKOFF_BASE,
+                 backoff_max=UPSTREAM_BACKOFF_MAX, retry_after_max=UPSTREAM_RETRY_AFTER_MAX,
+                 queue_timeout=UPSTREAM_QUEUE_TIMEOUT, sleep=time.sleep):
+        self.limiter = RateLimiter(rate, burst)
+        self.concurrency = concurrency or AdaptiveLimit()
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.queue_timeout = queue_timeout
+        self.sleep = sleep
+        self._in_flight = {}  # coalescing key -> Future of the leader's call
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.attempts = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self.failures = 0
+        self.queue_timeouts = 0
+
+    def install(self, api_client):
+        """Route `api_client.call_api` through this gateway."""
+        call_api = api_client.call_api
+
+        def gated_call_api(resource_path, method, *args, **kwargs):
+            return self.call(call_api, resource_path, method, *args, **kwargs)
+
+        api_client.call_api = gated_call_api
+        api_client.gateway = self
+        return api_client
+
+    @staticmethod
+    def _coalescing_key(resource_path, method, args, kwargs):
+        """Identity of a read, or None when the call must not be shared."""
+        params = dict(zip(CALL_API_PARAMS, args), **kwargs)
+        if method != 'GET' or params.get('async_req') or not params.get('_preload_content', True):
+            return None
+        return (resource_path, repr(sorted((params.get('path_params') or {}).items())),
+                repr(params.get('query_params')), repr(params.get('header_params')),
+                params.get('response_type'), params.get('_return_http_data_only'))
+
+    def call(self, call_api, resource_path, method, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+        key = self._coalescing_key(resource_path, method, args, kwargs)
+        if key is None:
+            return self._call_with_retry(call_api, resource_path, method, args, kwargs)
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            result = self._call_with_retry(call_api, resource_path, method, args, kwargs)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+        future.set_result(result)
+        return result
+
+    def _call_with_retry(self, call_api, resource_path, method, args, kwargs):
+        attempt = 0
+        while True:
+            self._wait_if_paused()
+            self.limiter.acquire(None)
+            if not self.concurrency.acquire(self.queue_timeout):
+                with self._lock:
+                    self.queue_timeouts += 1
+                    self.failures += 1
+                raise ApiException(status=503, reason='Upstream gateway queue timeout')
+            started = time.monotonic()
+            overloaded = False
+            try:
+                with self._lock:
+                    self.attempts += 1
+                return call_api(resource_path, method, *args, **kwargs)
+            except ApiException as e:
+                overloaded = e.status in OVERLOAD_STATUSES
+                delay = self._retry_delay(e, method, attempt)
+                if delay is None:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+            finally:
+                self.concurrency.release(time.monotonic() - started, overloaded)
+            attempt += 1
+            with self._lock:
+                self.retried += 1
+            logger.debug(f"Retrying {method} {resource_path} in {delay:.2f}s (attempt {attempt + 1})")
+            self.sleep(delay)
+
+    def _retry_delay(self, e, method, attempt):
+        """Seconds to wait before retrying after `e`, or None to give up."""
+        status = e.status
+        if status == 429:
+            with self._lock:
+                self.throttled += 1
+        retryable = status in RETRY_ANY_METHOD or (status in RETRY_IDEMPOTENT and method in IDEMPOTENT_METHODS)
+        if not retryable or attempt >= self.retries:
+            return None
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = retry_after_seconds(e)
+        if retry_after is None:
+            return backoff
+        if retry_after > self.retry_after_max:
+            return None
+        # The key's other calls would only earn the same answer, so hold them too
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        return max(retry_after, backoff)
+
+    def _wait_if_paused(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            self.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'attempts': self.attempts,
+                'retries': self.retried,
+                'coalesced': self.coalesced,
+                'throttled': self.throttled,
+                'failures': self.failures,
+                'queueTimeouts': self.queue_timeouts,
+                'inFlight': self.concurrency.in_flight,
+                'concurrencyLimit': int(self.concurrency.limit),
+                'limitDecreases': self.concurrency.decreases,
+            }
+
+
+# One gateway per pooled ApiClient (so per API key); dropped with the client
+_gateways = weakref.WeakSet()
+
+
+def install_gateway(api_client):
+    """Put a fresh UpstreamGateway in front of `api_client`, unless disabled.
+
+    The concurrency limit never grows past the client's urllib3 pool size:
+    calls beyond it would open throwaway connections ("Connection pool is
+    full") instead of queueing for a warm one.
+    """
+    if not GATEWAY_ENABLED:
+        return api_client
+    pool_maxsize = getattr(api_client.configuration, 'connection_pool_maxsize', None)
+    maximum = min(UPSTREAM_MAX_CONCURRENCY, pool_maxsize or UPSTREAM_MAX_CONCURRENCY)
+    gateway = UpstreamGateway(concurrency=AdaptiveLimit(maximum=maximum))
+    _gateways.add(gateway)
+    return gateway.install(api_client)
+
+
+def gateway_stats():
+    """Counters summed over every live gateway; the limit is the smallest one."""
+    totals = dict.fromkeys(('gateways', 'calls', 'attempts', 'retries', 'coalesced', 'throttled',
+                            'failures', 'queueTimeouts', 'inFlight', 'limitDecreases'), 0)
+    limits = []
+    for gateway in list(_gateways):
+        stats = gateway.stats()
+        limits.append(stats.pop('concurrencyLimit'))
+        totals['gateways'] += 1
+        for name, value in stats.items():
+            totals[name] += value
+    totals['minConcurrencyLimit'] = min(limits) if limits else 0
+    return totals
+
+
+registry.register_stats('emailgen_upstream_gateway', gateway_stats)
@@ -0,0 +1,109 @@
+import os
+import time
+import uuid
+import logging
+import threading
+
+from flask import Blueprint, request, jsonify
+
+from inbox_watcher import inbox_watcher
+from state_backend import state
+
+logger = logging.getLogger(__name__)
+
+WAIT_TIMEOUT = int(os.environ.get('WAIT_EMAIL_TIMEOUT', '60'))
+TICKET_TTL = float(os.environ.get('WAIT_EMAIL_TICKET_TTL', '300'))
+
+
+class WaitEngine:
+    """Parks wait_email requests on futures instead of on Flask workers.
+
+    Polling is delegated to the shared InboxWatcher; this class only maps
+    tickets to futures and forgets finished results after `ticket_ttl`. With
+    a shared state backend tickets are recorded there too, so a poll that
+    lands on another worker still finds its result.
+    """
+
+    def __init__(self, watcher=inbox_watcher, ticket_ttl=TICKET_TTL, state=state):
+        self.watcher = watcher
+        self.ticket_ttl = ticket_ttl
+        self.state = state
+        self._tickets = {}  # ticket -> Future
+        self._expiry = {}  # ticket -> monotonic time the result may be dropped
+        self._lock = threading.Lock()
+
+    def submit(self, api_key, inbox_id, timeout=WAIT_TIMEOUT):
+        """Register a wait and return its ticket."""
+        ticket = uuid.uuid4().hex
+        self.state.incr('waitsSubmitted')
+        if self.state.shared:
+            self.state.put_ticket(ticket, timeout + self.ticket_ttl)
+        future = self.watcher.watch(api_key, inbox_id, timeout)
+        with self._lock:
+            self._expire(time.monotonic())
+            self._tickets[ticket] = future
+        future.add_done_callback(lambda f: self._finished(ticket, f.result()))
+        return ticket
+
+    def future(self, ticket):
+        with self._lock:
+            return self._tickets.get(ticket)
+
+    def poll(self, ticket):
+        """Return the final result for `ticket`, {'pending': True} or None if unknown."""
+        future = self.future(ticket)
+        if future is None:
+            return self.state.get_ticket(ticket) if self.state.shared else None
+        if not future.done():
+            return {'pending': True, 'ticket': ticket}
+        return future.result()
+
+    def _finished(self, ticket, result):
+        try:
+            if result.get('timeout'):
+                self.state.incr('waitTimeouts')
+            if self.state.shared:
+                self.state.finish_ticket(ticket, result, self.ticket_ttl)
+        except Exception as e:
+            logger.error(f"Could not record the result of wait {ticket}: {e}")
+        with self._lock:
+            self._expiry[ticket] = time.monotonic() + self.ticket_ttl
+
+    def _expire(self, now):
+        # Caller holds the lock
+        for ticket, expires in list(self._expiry.items()):
+            if expires > now:
+                break  # insertion order is expiry order
+            del self._expiry[ticket]
+            self._tickets.pop(ticket, None)
+
+
+wait_engine = WaitEngine()
+
+waits_bp = Blueprint('waits', __name__)
+
+
+@waits_bp.route('/api/wait_email/submit', methods=['POST'])
+def submit_wait():
+    data = request.get_json(silent=True) or {}
+    api_key = data.get('apiKey')
+    inbox_id = data.get('inboxId')
+    if not api_key or not inbox_id:
+        return jsonify({'error': 'API key and inbox ID are required'}), 400
+
+    try:
+        timeout = min(int(data.get('timeout', WAIT_TIMEOUT)), WAIT_TIMEOUT)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'timeout must be a number of seconds'}), 400
+    if timeout < 1:
+        return jsonify({'error': 'timeout must be at least 1 second'}), 400
+    ticket = wait_engine.submit(api_key, inbox_id, timeout)
+    return jsonify({'ticket': ticket, 'pending': True, 'timeoutDuration': timeout}), 202
+
+
+@waits_bp.route('/api/wait_email/<ticket>', methods=['GET'])
+def poll_wait(ticket):
+    result = wait_engine.poll(ticket)
+    if result is None:
+        return jsonify({'error': 'Unknown or expired wait ticket'}), 404
+    return jsonify(result)
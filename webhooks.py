@@ -0,0 +1,264 @@
+import os
+import hmac
+import hashlib
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, request, jsonify
+
+import routing
+from client_pool import get_api_client
+from email_cache import email_cache, get_email, key_digest
+from inbox_watcher import inbox_watcher
+from lazy_mailslurp import mailslurp_client, ApiException
+from metrics import registry
+from state_backend import state
+
+logger = logging.getLogger(__name__)
+
+# Public base URL MailSlurp can reach this app on; unset disables registration
+BASE_URL = os.environ.get('WEBHOOK_BASE_URL')
+# Signs the per-inbox token in each webhook URL. Without it a random secret is
+# used, so webhooks registered by an earlier process stop verifying on restart.
+# Required whenever another process may receive the push (a shared state
+# backend or CLUSTER_NODES routing), since each would pick its own secret.
+SECRET = os.environ.get('WEBHOOK_SECRET')
+if SECRET is None:
+    if BASE_URL and (state.shared or routing.NODES):
+        raise RuntimeError('WEBHOOK_SECRET must be set when webhooks are served by more than one '
+                           'process (STATE_BACKEND=sqlite or CLUSTER_NODES)')
+    SECRET = secrets.token_hex(32)
+WORKERS = int(os.environ.get('WEBHOOK_WORKERS', '8'))
+INDEX_MAX_INBOXES = int(os.environ.get('WEBHOOK_INDEX_MAX_INBOXES', '100000'))
+SEEN_MAX_MESSAGES = int(os.environ.get('WEBHOOK_SEEN_MAX_MESSAGES', '100000'))
+# Message IDs are shared between workers this long to catch redeliveries
+SEEN_TTL = 24 * 3600
+EMAIL_EVENTS = ('EMAIL_RECEIVED', 'NEW_EMAIL')
+# Payload fields that must be strings when present
+_OPTIONAL_FIELDS = ('emailId', 'messageId', 'eventName')
+
+
+def webhook_token(inbox_id):
+    return hmac.new(SECRET.encode('utf-8'), inbox_id.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+
+def webhook_url(inbox_id):
+    return f"{BASE_URL.rstrip('/')}/api/webhooks/mailslurp?token={webhook_token(inbox_id)}"
+
+
+def _keystream(inbox_id, length):
+    # HMAC-SHA256 in counter mode, one 32-byte block per step
+    secret = SECRET.encode('utf-8')
+    blocks = (hmac.new(secret, f'owner\0{inbox_id}\0{i}'.encode('utf-8'), hashlib.sha256).digest()
+              for i in range(-(-length // 32)))
+    return b''.join(blocks)[:length]
+
+
+def seal_key(inbox_id, api_key):
+    """`api_key` encrypted under WEBHOOK_SECRET, for the shared owner table."""
+    data = api_key.encode('utf-8')
+    return bytes(a ^ b for a, b in zip(data, _keystream(inbox_id, len(data))))
+
+
+def unseal_key(inbox_id, digest, sealed):
+    """The API key behind `sealed`, or None if it does not match `digest` (e.g. another secret)."""
+    try:
+        api_key = bytes(a ^ b for a, b in zip(sealed, _keystream(inbox_id, len(sealed)))).decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    return api_key if hmac.compare_digest(key_digest(api_key), digest) else None
+
+
+class InboxIndex:
+    """Which API key owns each inbox that pushes to us, plus recent message IDs.
+
+    MailSlurp payloads name the inbox and email but not the key, so an inbox
+    has to be indexed here before its webhooks can be acted on. Message IDs
+    are remembered so redelivered webhooks are only processed once. With a
+    shared state backend both are shared too, so any worker can take a push
+    for an inbox another worker created.
+    """
+
+    def __init__(self, max_inboxes=INDEX_MAX_INBOXES, max_seen=SEEN_MAX_MESSAGES, state=state):
+        self.max_inboxes = max_inboxes
+        self.max_seen = max_seen
+        self.state = state
+        self._inboxes = OrderedDict()  # inbox_id -> (api_key, webhook_id)
+        self._seen = OrderedDict()  # message_id -> None
+        self._lock = threading.Lock()
+        self.received = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.delivered = 0
+        self.unclaimed = 0
+        self.fetch_errors = 0
+        self.forwarded = 0
+        self.forward_errors = 0
+
+    def add(self, api_key, inbox_id, webhook_id=None):
+        with self._lock:
+            self._inboxes[inbox_id] = (api_key, webhook_id)
+            self._inboxes.move_to_end(inbox_id)
+            while len(self._inboxes) > self.max_inboxes:
+                self._inboxes.popitem(last=False)
+        if self.state.shared:
+            self.state.set_owner(inbox_id, key_digest(api_key), seal_key(inbox_id, api_key))
+
+    def owner(self, inbox_id):
+        with self._lock:
+            entry = self._inboxes.get(inbox_id)
+        if entry is None and self.state.shared:
+            shared = self.state.owner(inbox_id)
+            return unseal_key(inbox_id, *shared) if shared else None
+        return entry[0] if entry else None
+
+    def first_sighting(self, message_id):
+        """True the first time `message_id` is seen; retries of it return False."""
+        with self._lock:
+            if message_id in self._seen:
+                return False
+            self._seen[message_id] = None
+            while len(self._seen) > self.max_seen:
+                self._seen.popitem(last=False)
+        if self.state.shared:
+            return self.state.claim(f'message:{message_id}', SEEN_TTL)
+        return True
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inboxes': len(self._inboxes),
+                'registered': sum(1 for _, webhook_id in self._inboxes.values() if webhook_id),
+                'received': self.received,
+                'rejected': self.rejected,
+                'duplicates': self.duplicates,
+                'delivered': self.delivered,
+                'unclaimed': self.unclaimed,
+                'fetchErrors': self.fetch_errors,
+                'forwarded': self.forwarded,
+                'forwardErrors': self.forward_errors,
+            }
+
+
+inbox_index = InboxIndex()
+registry.register_stats('emailgen_webhooks', inbox_index.stats)
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='webhook')
+
+
+def _create_upstream_webhook(api_key, inbox_id):
+    try:
+        webhook_api = mailslurp_client.WebhookControllerApi(get_api_client(api_key))
+        webhook = webhook_api.create_webhook(inbox_id, mailslurp_client.CreateWebhookOptions(
+            url=webhook_url(inbox_id), name='emailgen'))
+        inbox_index.add(api_key, inbox_id, webhook.id)
+    except ApiException as e:
+        logger.warning(f"Webhook registration for inbox {inbox_id} failed, polling only: {e.status} {e.reason}")
+    except Exception as e:
+        logger.warning(f"Webhook registration for inbox {inbox_id} failed, polling only: {e}")
+
+
+def register_webhook(api_key, inbox_id):
+    """Index `inbox_id` and ask MailSlurp to push its new emails to us.
+
+    Registration runs in the background so inbox creation does not pay for a
+    second upstream call; until it lands, waits on the inbox are served by
+    polling as before. A no-op unless WEBHOOK_BASE_URL is set.
+    """
+    if not BASE_URL:
+        return
+    inbox_index.add(api_key, inbox_id)
+    _executor.submit(_create_upstream_webhook, api_key, inbox_id)
+
+
+def _ingest(api_key, inbox_id, email_id):
+    # A cache hit means the poller already fetched and delivered this email
+    if email_cache.get(api_key, email_id) is not None:
+        inbox_index.count('duplicates')
+        return
+    try:
+        email = get_email(api_key, email_id)
+    except ApiException as e:
+        logger.error(f"MailSlurp API error fetching pushed email {email_id}: {e}")
+        inbox_index.count('fetch_errors')
+        return
+    except Exception as e:
+        logger.error(f"Unexpected error fetching pushed email {email_id}: {e}")
+        inbox_index.count('fetch_errors')
+        return
+    if inbox_watcher.deliver(api_key, inbox_id, email, hold=True):
+        inbox_index.count('delivered')
+    else:
+        # Held for the next wait, or the poller got there first
+        inbox_index.count('unclaimed')
+
+
+def _accept(payload):
+    """Act on a verified webhook on this node; returns (response body, status)."""
+    inbox_id = payload.get('inboxId')
+    email_id = payload.get('emailId')
+    api_key = inbox_index.owner(inbox_id)
+    if api_key is None:
+        # Verified but unknown (e.g. indexed by an earlier process): polling covers it
+        inbox_index.count('rejected')
+        return {'accepted': False, 'reason': 'Unknown inbox'}, 200
+
+    if payload.get('eventName') not in EMAIL_EVENTS or not email_id:
+        return {'accepted': False, 'reason': 'Not a new-email event'}, 200
+    if not inbox_index.first_sighting(payload.get('messageId') or email_id):
+        inbox_index.count('duplicates')
+        return {'accepted': True, 'duplicate': True}, 200
+
+    # Acknowledge at once; MailSlurp retries webhooks that are slow to answer
+    _executor.submit(_ingest, api_key, inbox_id, email_id)
+    return {'accepted': True}, 200
+
+
+def _forward(node, path, body, payload):
+    try:
+        routing.forward(node, path, body)
+    except Exception as e:
+        logger.warning(f"Forwarding webhook for inbox {payload.get('inboxId')} to {node} failed, "
+                       f"handling it here: {e}")
+        inbox_index.count('forward_errors')
+        _accept(payload)
+
+
+webhooks_bp = Blueprint('webhooks', __name__)
+
+
+@webhooks_bp.route('/api/webhooks/mailslurp', methods=['POST'])
+def mailslurp_webhook():
+    payload = request.get_json(silent=True)
+    inbox_index.count('received')
+    if not isinstance(payload, dict) or not isinstance(payload.get('inboxId'), str) or any(
+            not isinstance(payload.get(field), (str, type(None))) for field in _OPTIONAL_FIELDS):
+        inbox_index.count('rejected')
+        return jsonify({'error': 'Expected a JSON object with a string inboxId (and string emailId, messageId, eventName)'}), 400
+    inbox_id = payload['inboxId']
+
+    token = request.args.get('token', '')
+    if not inbox_id or not hmac.compare_digest(token, webhook_token(inbox_id)):
+        inbox_index.count('rejected')
+        return jsonify({'error': 'Invalid webhook token'}), 403
+
+    # With consistent-hash routing, pushes go to the node the inbox's waits are on
+    node = None if request.headers.get(routing.FORWARDED_HEADER) else routing.remote_owner(inbox_id)
+    if node is not None:
+        inbox_index.count('forwarded')
+        _executor.submit(_forward, node, request.full_path, request.get_data(), payload)
+        return jsonify({'accepted': True, 'forwarded': True}), 200
+
+    body, status = _accept(payload)
+    return jsonify(body), status
+
+
+@webhooks_bp.route('/api/webhooks/stats', methods=['GET'])
+def webhook_stats():
+    return jsonify(inbox_index.stats())